@@ -0,0 +1,64 @@
+'''
+Build benchmark.
+
+Builds an executable the old way, writing the text IR and running `llc` and
+`gcc` on it, and the new way, emitting the object in-process and linking it
+once. The output cache is disabled, so every build compiles.
+
+    $ python -m benchmarks.build -f example.ce -n 10
+'''
+import os
+import sys
+import time
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+
+
+def pipeline(filename, path):
+    ''' main.py, llc and gcc, through files '''
+    ir = os.path.join(path, 'out.ir')
+    obj = os.path.join(path, 'out.o')
+    with open(ir, 'wb') as f:
+        command = [sys.executable, MAIN, '-f', filename, '--no-cache']
+        subprocess.run(command, check=True, stdout=f)
+    subprocess.run(['llc', ir, '-o', obj, '-filetype=obj'], check=True)
+    subprocess.run(['gcc', obj, '-o', os.path.join(path, 'a.out')],
+                   check=True)
+
+
+def direct(filename, path):
+    ''' main.py emitting the object and linking it '''
+    output = os.path.join(path, 'a.out')
+    command = [sys.executable, MAIN, '-f', filename, '--no-cache',
+               '-o', output]
+    subprocess.run(command, check=True)
+
+
+def measure(build, filename, times):
+    ''' Returns the mean wall time, in seconds, of the build '''
+    with tempfile.TemporaryDirectory() as path:
+        start = time.perf_counter()
+        for _ in range(times):
+            build(filename, path)
+        return (time.perf_counter() - start) / times
+
+
+if __name__ == '__main__':
+    arg_parser = ArgumentParser(description='Build benchmark')
+    arg_parser.add_argument('--file', '-f', default='example.ce')
+    arg_parser.add_argument('--times', '-n', type=int, default=10)
+    args = arg_parser.parse_args()
+
+    # Warm up the parser tables
+    measure(direct, args.file, 1)
+
+    old = measure(pipeline, args.file, args.times)
+    new = measure(direct, args.file, args.times)
+    print('llc+gcc %8.2f ms' % (old * 1000))
+    print('direct  %8.2f ms' % (new * 1000))
+    print('gain    %8.2fx' % (old / new))
@@ -0,0 +1,70 @@
+'''
+Parallel object emission benchmark.
+
+Optimizes a program with `functions` functions once, emits its object in 1,
+2, 4, ... processes, and prints the best time of each and whether the output
+is the same as with one process.
+
+    $ python -m benchmarks.jobs -n 1000 -j 1 2 4 8 16 32
+'''
+import time
+from argparse import ArgumentParser
+
+from ce import backend
+from ce.compiler import Options, lower, optimize
+from ce.parser import create_parser
+
+
+FUNCTION = '''
+medio f%d(medio n) {
+    medio total = 0;
+    para (medio i = 0; i < n; i = i + 1) {
+        caso (i %% 5) {
+            seja (0) { total = total + i; }
+            seja (1) { total = total - %d; }
+            senao { total = total * 2; }
+        }
+        se (total > 1000) { total = total %% 97; }
+    }
+    devolve total;
+}
+'''
+
+
+def source(functions):
+    ''' Program with `functions` functions and a main calling the last '''
+    data = ''.join(FUNCTION % (i, i) for i in range(functions))
+    return data + 'medio main() { devolve f%d(10); }' % (functions - 1)
+
+
+def measure(text, level, jobs, times=3):
+    ''' Returns the best time, in seconds, and the output '''
+    best = float('inf')
+    for _ in range(times):
+        # Emission renames the private symbols of the module
+        mod = backend.parse(text)
+        start = time.perf_counter()
+        output = backend.emit(mod, 'obj', level, jobs)
+        best = min(best, time.perf_counter() - start)
+    return best, output
+
+
+if __name__ == '__main__':
+    arg_parser = ArgumentParser(description='Parallel emission benchmark')
+    arg_parser.add_argument('--functions', '-n', type=int, default=1000)
+    arg_parser.add_argument('--jobs', '-j', type=int, nargs='+',
+                            default=[1, 2, 4])
+    arg_parser.add_argument('-O', dest='opt', default='2')
+    args = arg_parser.parse_args()
+
+    options = Options(opt=args.opt)
+    tree = create_parser(debug=False, cache=True).parse(
+        source(args.functions))
+    text = str(optimize(lower(tree, options), options))
+    serial, expected = measure(text, args.opt, 1)
+    print('%6s %10s %8s %6s' % ('jobs', 'ms', 'speedup', 'same'))
+    for jobs in args.jobs:
+        best, output = measure(text, args.opt, jobs)
+        same = 'yes' if output == expected else 'NO'
+        speedup = serial / best
+        print('%6d %10.1f %8.2f %6s' % (jobs, best * 1000, speedup, same))
@@ -0,0 +1,85 @@
+'''
+Link time optimization benchmark.
+
+Builds a program split in two files, whose main loop calls a small helper
+of the other file, with each file optimized on its own and with --lto, and
+prints the best run time of each executable.
+
+    $ python -m benchmarks.lto -n 100000000 -O2
+'''
+import os
+import sys
+import time
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+
+HELPERS = '''
+medio soma(medio a, medio b) {
+    devolve a + b;
+}
+'''
+
+PROGRAM = '''
+medio soma(medio a, medio b);
+
+medio main() {
+    medio total = 0;
+    para (medio i = 0; i < %d; i = i + 1) {
+        total = soma(total, i %% 7);
+    }
+    devolve total %% 256;
+}
+'''
+
+
+def build(path, iterations, opt, lto):
+    ''' Builds the program and returns the executable '''
+    files = []
+    for name, data in (('main.ce', PROGRAM % iterations),
+                       ('soma.ce', HELPERS)):
+        files.append(os.path.join(path, name))
+        with open(files[-1], 'w') as f:
+            f.write(data)
+    output = os.path.join(path, 'lto' if lto else 'units')
+    command = [sys.executable, MAIN, '-f', *files, '-O' + opt, '-o', output,
+               '--no-cache']
+    if lto:
+        command.append('--lto')
+    subprocess.run(command, check=True)
+    return output
+
+
+def measure(executable, times):
+    ''' Returns the best wall time, in seconds, and the exit status '''
+    best = float('inf')
+    for _ in range(times):
+        start = time.perf_counter()
+        status = subprocess.run([executable]).returncode
+        best = min(best, time.perf_counter() - start)
+    return best, status
+
+
+if __name__ == '__main__':
+    arg_parser = ArgumentParser(description='LTO benchmark')
+    arg_parser.add_argument('--iterations', '-n', type=int,
+                            default=100000000)
+    arg_parser.add_argument('--times', '-t', type=int, default=5)
+    arg_parser.add_argument('-O', dest='opt', default='2')
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as path:
+        units = build(path, args.iterations, args.opt, False)
+        lto = build(path, args.iterations, args.opt, True)
+        units, expected = measure(units, args.times)
+        lto, status = measure(lto, args.times)
+
+    print('per unit %8.2f ms' % (units * 1000))
+    print('lto      %8.2f ms' % (lto * 1000))
+    print('gain     %8.2fx' % (units / lto))
+    if status != expected:
+        print('different exit status: %d, %d' % (expected, status))
@@ -0,0 +1,55 @@
+'''
+Deep nesting benchmark.
+
+Compiles a function whose body is nested `depth` blocks deep, with the
+variables declared at the top and used in the innermost block, and prints
+the validation and generation times.
+
+    $ python -m benchmarks.nesting -d 1 16 64 256
+'''
+import sys
+import time
+from argparse import ArgumentParser
+
+from ce.parser import create_parser
+
+
+def source(depth, statements):
+    ''' Function with `statements` assignments `depth` blocks deep '''
+    lines = ['medio main() {', 'medio a = 0;', 'medio b = 1;']
+    lines += ['se (a < 1) {'] * depth
+    lines += ['a = a + b * a - b;'] * statements
+    lines += ['}'] * depth
+    lines += ['devolve a;', '}']
+    return '\n'.join(lines)
+
+
+def measure(depth, statements, times=3):
+    ''' Returns the best validation and generation times, in seconds '''
+    parser = create_parser(debug=False, cache=True, backend='descent')
+    data = source(depth, statements)
+    best = (float('inf'), float('inf'))
+    for _ in range(times):
+        tree = parser.parse(data)
+        start = time.perf_counter()
+        tree.validate()
+        validated = time.perf_counter()
+        tree.generate()
+        generated = time.perf_counter()
+        best = min(best[0], validated - start), \
+            min(best[1], generated - validated)
+    return best
+
+
+if __name__ == '__main__':
+    arg_parser = ArgumentParser(description='Deep nesting benchmark')
+    arg_parser.add_argument('--depths', '-d', type=int, nargs='+',
+                            default=[1, 16, 64, 256])
+    arg_parser.add_argument('--statements', '-s', type=int, default=5000)
+    args = arg_parser.parse_args()
+    sys.setrecursionlimit(10000)
+
+    print('%6s %12s %12s' % ('depth', 'validate ms', 'generate ms'))
+    for depth in args.depths:
+        validate, generate = measure(depth, args.statements)
+        print('%6d %12.1f %12.1f' % (depth, validate * 1000, generate * 1000))
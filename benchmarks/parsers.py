@@ -0,0 +1,42 @@
+'''
+Parser backends benchmark.
+
+Parses the same source with the PLY and the hand written parsers and
+prints their throughput.
+
+    $ python -m benchmarks.parsers -f example.ce -r 500
+'''
+import time
+from argparse import ArgumentParser
+
+from ce.lexer import TokenArray
+from ce.parser import create_parser
+
+
+def measure(backend, data, times):
+    ''' Returns the best parse time, in seconds, of the backend '''
+    parser = create_parser(debug=False, cache=True, backend=backend)
+    best = float('inf')
+    for _ in range(times):
+        stream = TokenArray(data).stream()
+        start = time.perf_counter()
+        parser.parse(lexer=stream)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    arg_parser = ArgumentParser(description='Parser backends benchmark')
+    arg_parser.add_argument('--file', '-f', default='example.ce')
+    arg_parser.add_argument('--repeat', '-r', type=int, default=500)
+    arg_parser.add_argument('--times', '-n', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    with open(args.file) as f:
+        data = f.read() * args.repeat
+    count = len(TokenArray(data))
+
+    print('%-8s %10s %14s' % ('', 'seconds', 'tokens/sec'))
+    for backend in ('ply', 'descent'):
+        elapsed = measure(backend, data, args.times)
+        print('%-8s %10.3f %14.0f' % (backend, elapsed, count / elapsed))
@@ -0,0 +1,78 @@
+'''
+Symbol table benchmark.
+
+Looks up names declared in the outermost scope from scopes nested 1 to 256
+deep, and times pushing and popping scopes. `ListScopes` is the previous
+list of dicts implementation, kept for comparison.
+
+    $ python -m benchmarks.scopes
+'''
+import timeit
+from argparse import ArgumentParser
+
+from ce.scope import Scopes
+
+
+class ListScopes(object):
+    ''' Scans the scopes from the innermost one on every lookup '''
+
+    def __init__(self):
+        self.scopes = [{}]
+
+    def create(self):
+        self.scopes.append({})
+
+    def pop(self):
+        return self.scopes.pop()
+
+    def get(self, name):
+        for s in reversed(self.scopes):
+            if name in s:
+                return s[name]
+        return None
+
+    def __setitem__(self, key, value):
+        self.scopes[-1][key] = value
+
+
+def nested(cls, depth):
+    ''' Symbol table `depth` scopes deep, with a few names in each scope '''
+    scopes = cls()
+    for level in range(depth):
+        scopes.create()
+        for i in range(4):
+            scopes['v%d_%d' % (level, i)] = level
+    return scopes
+
+
+def lookup(cls, depth, number):
+    ''' Nanoseconds per lookup of an outermost name '''
+    scopes = nested(cls, depth)
+    time = timeit.timeit(lambda: scopes.get('v0_0'), number=number)
+    return time / number * 1e9
+
+
+def push_pop(cls, number):
+    ''' Nanoseconds to push a scope, bind 4 names and pop it '''
+    scopes = nested(cls, 16)
+
+    def run():
+        scopes.create()
+        scopes['a'] = scopes['b'] = scopes['c'] = scopes['d'] = 0
+        scopes.pop()
+    return timeit.timeit(run, number=number) / number * 1e9
+
+
+if __name__ == '__main__':
+    arg_parser = ArgumentParser(description='Symbol table benchmark')
+    arg_parser.add_argument('--number', '-n', type=int, default=100000)
+    args = arg_parser.parse_args()
+
+    print('%8s %14s %14s' % ('depth', 'Scopes ns', 'ListScopes ns'))
+    for depth in (1, 2, 4, 8, 16, 32, 64, 128, 256):
+        new = lookup(Scopes, depth, args.number)
+        old = lookup(ListScopes, depth, args.number)
+        print('%8d %14.1f %14.1f' % (depth, new, old))
+    new = push_pop(Scopes, args.number)
+    old = push_pop(ListScopes, args.number)
+    print('%8s %14.1f %14.1f' % ('push/pop', new, old))
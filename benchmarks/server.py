@@ -0,0 +1,55 @@
+'''
+Compile server benchmark.
+
+Compiles the file `times` times with main.py, paying the startup of each
+process, and with `python -m ce.client` against a warm server, and prints the
+mean latency of each. The output cache is disabled, so every request
+compiles.
+
+    $ python -m benchmarks.server -f example.ce -n 20
+'''
+import os
+import sys
+import time
+import tempfile
+import threading
+import subprocess
+from argparse import ArgumentParser
+
+from ce.server import CompileServer
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+
+
+def measure(command, times):
+    ''' Returns the mean wall time, in seconds, of the command '''
+    start = time.perf_counter()
+    for _ in range(times):
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start) / times
+
+
+if __name__ == '__main__':
+    arg_parser = ArgumentParser(description='Compile server benchmark')
+    arg_parser.add_argument('--file', '-f', default='example.ce')
+    arg_parser.add_argument('--times', '-n', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as path:
+        socket = os.path.join(path, 'ce.sock')
+        with CompileServer(socket, cache=False) as server:
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            cold = measure([sys.executable, MAIN, '-f', args.file, '-O2',
+                            '--no-cache'], args.times)
+            warm = measure([sys.executable, '-m', 'ce.client', '-f',
+                            args.file, '-O2', '--socket', socket],
+                           args.times)
+            server.shutdown()
+            thread.join()
+
+    print('main.py  %8.2f ms' % (cold * 1000))
+    print('client   %8.2f ms' % (warm * 1000))
+    print('gain     %8.2fx' % (cold / warm))
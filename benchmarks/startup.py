@@ -0,0 +1,43 @@
+'''
+Startup benchmark.
+
+Runs `main.py` several times as a new process, as build scripts do, and
+compares rebuilding the parser tables with `--debug` against loading the
+cached tables.
+
+    $ python -m benchmarks.startup -f example.ce -n 20
+'''
+import os
+import sys
+import time
+import subprocess
+from argparse import ArgumentParser
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+
+
+def run(filename, times, *flags):
+    ''' Returns the mean wall time, in seconds, of running `main.py` '''
+    command = [sys.executable, MAIN, '-f', filename, *flags]
+    start = time.perf_counter()
+    for _ in range(times):
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start) / times
+
+
+if __name__ == '__main__':
+    arg_parser = ArgumentParser(description='Startup benchmark')
+    arg_parser.add_argument('--file', '-f', default='example.ce')
+    arg_parser.add_argument('--times', '-n', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    # Warm up the cache
+    run(args.file, 1)
+
+    debug = run(args.file, args.times, '--debug')
+    cached = run(args.file, args.times)
+    print('debug  %8.2f ms' % (debug * 1000))
+    print('cached %8.2f ms' % (cached * 1000))
+    print('gain   %8.2fx' % (debug / cached))
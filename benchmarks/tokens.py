@@ -0,0 +1,52 @@
+'''
+Token storage benchmark.
+
+Compares keeping the `lexer.token()` tokens in a list against
+`TokenArray`, in tokens per second and bytes per stored token.
+
+    $ python -m benchmarks.tokens -f example.ce -r 2000
+'''
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+from ce.lexer import lexer, TokenArray
+
+
+def lex_tokens(data):
+    lex = lexer.clone()
+    lex.lineno = 1
+    lex.input(data)
+    return list(lex)
+
+
+def measure(function, data):
+    ''' Returns the token count, tokens/sec and bytes/token of function '''
+    start = time.perf_counter()
+    result = function(data)
+    elapsed = time.perf_counter() - start
+    count = len(result)
+    del result
+
+    tracemalloc.start()
+    result = function(data)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return count, count / elapsed, size / count
+
+
+if __name__ == '__main__':
+    arg_parser = ArgumentParser(description='Token storage benchmark')
+    arg_parser.add_argument('--file', '-f', default='example.ce')
+    arg_parser.add_argument('--repeat', '-r', type=int, default=2000)
+    args = arg_parser.parse_args()
+
+    with open(args.file) as f:
+        data = f.read() * args.repeat
+
+    print('%-12s %10s %14s %12s' % ('', 'tokens', 'tokens/sec', 'bytes/token'))
+    for name, function in (('lexer.token', lex_tokens),
+                           ('TokenArray', TokenArray)):
+        count, speed, size = measure(function, data)
+        print('%-12s %10d %14.0f %12.1f' % (name, count, speed, size))
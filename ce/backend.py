@@ -0,0 +1,414 @@
+import os
+import re
+import ctypes
+import hashlib
+import tempfile
+import subprocess
+from functools import lru_cache
+from itertools import chain
+from multiprocessing import Pool
+
+import llvmlite.binding as llvm
+
+
+@lru_cache(maxsize=None)
+def initialize():
+    ''' Initializes the native target, once '''
+    llvm.initialize_native_target()
+    llvm.initialize_native_asmprinter()
+
+
+def target_machine(level='2', **kwargs):
+    '''
+    Target machine of the host, generating code at the given level.
+    Keyword arguments go to `llvm.Target.create_target_machine`.
+    '''
+    initialize()
+    target = llvm.Target.from_default_triple()
+    return target.create_target_machine(opt=_speed(level), **kwargs)
+
+
+def _speed(level):
+    ''' Speed level (0 to 3) of an optimization level '''
+    if level not in LEVELS:
+        raise ValueError('Unknown optimization level "%s"' % level)
+    return 2 if level == 's' else int(level)
+
+
+def parse(module):
+    '''
+    Parses and verifies the generated module, targeting the host.
+
+    Args:
+        module: An `ir.Module`.
+
+    Returns:
+        The `llvm.ModuleRef`.
+    '''
+    tm = target_machine()
+    mod = llvm.parse_assembly(str(module))
+    mod.verify()
+    mod.triple = tm.triple
+    mod.data_layout = str(tm.target_data)
+    return mod
+
+
+def promote(mod):
+    '''
+    Promotes the allocas of the module to SSA registers (mem2reg), in place.
+
+    Only works for the allocas in the entry block of each function, where
+    `DeclVariable.generate` places them.
+    '''
+    tm = target_machine()
+    pto = llvm.create_pipeline_tuning_options(speed_level=0)
+    pb = llvm.create_pass_builder(tm, pto)
+    mpm = llvm.create_new_module_pass_manager()
+    mpm.add_sroa_pass()
+    mpm.run(mod, pb)
+    return mod
+
+
+# Optimization levels, as in -O0 ... -O3 and -Os
+LEVELS = ('0', '1', '2', '3', 's')
+
+
+def optimize(mod, level='2', passes=()):
+    '''
+    Optimizes the module in place.
+
+    Args:
+        mod: An `llvm.ModuleRef`.
+        level: One of LEVELS. Runs LLVM's default pipeline for the level.
+            There is no size level in the pipeline tuning options, so 's'
+            is level 2 without loop unrolling or vectorization and with the
+            lower inlining threshold of -Os.
+        passes: Names of extra passes to run afterwards, such as 'sroa' or
+            'instruction_combine', from the `add_<name>_pass` methods of
+            `llvm.ModulePassManager`.
+
+    Returns:
+        The module.
+    '''
+    tm = target_machine(level)
+    pto = llvm.create_pipeline_tuning_options(speed_level=_speed(level))
+    if level == 's':
+        pto.loop_unrolling = False
+        pto.loop_vectorization = False
+        pto.inlining_threshold = 75
+    pb = llvm.create_pass_builder(tm, pto)
+
+    if level != '0':
+        pb.getModulePassManager().run(mod, pb)
+
+    if passes:
+        mpm = llvm.create_new_module_pass_manager()
+        for name in passes:
+            add = getattr(mpm, 'add_%s_pass' % name, None)
+            if add is None:
+                raise ValueError('Unknown pass "%s"' % name)
+            add()
+        mpm.run(mod, pb)
+    return mod
+
+
+def internalize(mod, keep=('main',)):
+    '''
+    Gives internal linkage to the definitions of the module, but `keep`, in
+    place. The optimizer may then inline, specialize or drop them, as they
+    are not used outside the module.
+    '''
+    for value in [*mod.functions, *mod.global_variables]:
+        if not value.is_declaration and value.name not in keep:
+            value.linkage = 'internal'
+    return mod
+
+
+def instruction_counts(mod):
+    ''' Returns the number of instructions of each defined function '''
+    return {
+        fn.name: sum(len(list(b.instructions)) for b in fn.blocks)
+        for fn in mod.functions if not fn.is_declaration
+    }
+
+
+# Metadata nodes, labels of blocks, loop IDs and vectors in LLVM IR
+METADATA = re.compile(r'^!(\d+) = (?:distinct )?!\{(.*)\}$', re.M)
+LABEL = re.compile(r'^(?:[-\w.$]+|"[^"]*"):')
+LOOP = re.compile(r'!llvm\.loop !(\d+)')
+VECTOR = re.compile(r'<(\d+) x ')
+
+
+def loops(mod):
+    '''
+    Vectorization of the loops of the module.
+
+    Loops are identified by the name in their `ce.loop` metadata, which
+    LLVM keeps when it transforms them. The width of a loop is the number of
+    lanes of the widest vector used in the block ending in its back edge.
+
+    Returns:
+        A dict with the width of each loop, 1 if it was not vectorized.
+        Loops removed by the optimizations, such as fully unrolled ones, are
+        left out.
+    '''
+    text = str(mod)
+    metadata = dict(METADATA.findall(text))
+    names = {}
+    for number, operands in metadata.items():
+        for ref in re.findall(r'!(\d+)', operands):
+            match = re.match(r'!"ce\.loop", !"(.*)"', metadata.get(ref, ''))
+            if match is not None:
+                names[number] = match.group(1)
+
+    widths = {}
+    block = []
+    for line in text.splitlines():
+        if LABEL.match(line) or line.startswith('define'):
+            block = []
+        block.append(line)
+        match = LOOP.search(line)
+        if match is None or match.group(1) not in names:
+            continue
+        lanes = [int(n) for code in block for n in VECTOR.findall(code)]
+        name = names[match.group(1)]
+        widths[name] = max([widths.get(name, 1), *lanes])
+    return widths
+
+
+# Return types of the functions `run` can call
+CTYPES = {
+    'void': None,
+    'i1': ctypes.c_bool,
+    'i8': ctypes.c_int8,
+    'i16': ctypes.c_int16,
+    'i32': ctypes.c_int32,
+    'i64': ctypes.c_int64,
+    'float': ctypes.c_float,
+    'double': ctypes.c_double,
+}
+
+
+def run(mod, level='0', name='main'):
+    '''
+    JIT compiles the module with MCJIT and calls one of its functions.
+
+    Args:
+        mod: An `llvm.ModuleRef`, owned by the JIT afterwards.
+        level: Optimization level of the machine code.
+        name: Function without parameters to call.
+
+    Returns:
+        The value returned by the function.
+
+    Raises:
+        NameError: A function is declared, but neither defined in the module
+            nor found in the process, as a prototype without definition.
+    '''
+    function = mod.get_function(name)
+    typ = function.global_value_type
+    if list(typ.get_function_parameters()):
+        raise TypeError('Function "%s" must have no parameters' % name)
+    restype = CTYPES[str(typ.get_function_return())]
+
+    # The engine loads the symbols of the process, such as those of libc
+    engine = llvm.create_mcjit_compiler(mod, target_machine(level))
+    # MCJIT would call address 0 for the unresolved ones
+    for value in mod.functions:
+        if value.is_declaration and not value.name.startswith('llvm.') \
+                and llvm.address_of_symbol(value.name) is None:
+            raise NameError('Function "%s" is declared but not defined'
+                            % value.name)
+    engine.finalize_object()
+    address = engine.get_function_address(name)
+    return ctypes.CFUNCTYPE(restype)(address)()
+
+
+# Kinds of output of `emit`
+KINDS = ('ir', 'bc', 'asm', 'obj')
+
+
+def emit(mod, kind, level='0', jobs=1):
+    '''
+    Emits the module without leaving the process, but for the objects of
+    big modules, see `emit_object`.
+
+    Args:
+        mod: An `llvm.ModuleRef`.
+        kind: One of KINDS: LLVM IR text or bitcode, assembly or object.
+        level: Optimization level of the machine code.
+        jobs: Processes emitting the partitions of objects.
+
+    Returns:
+        The bytes of the output.
+    '''
+    if kind == 'obj':
+        return emit_object(mod, level, jobs)
+    if kind == 'ir':
+        return str(mod).encode()
+    if kind == 'bc':
+        # The symbol tables of the functions are written in the order their
+        # names were inserted. Reparsing the printed module makes it the
+        # order of the text, whether the module was linked or not
+        return llvm.parse_assembly(str(mod)).as_bitcode()
+    # Position independent, to be linked into PIE executables
+    tm = target_machine(level, reloc='pic', codemodel='default')
+    if kind == 'asm':
+        return tm.emit_assembly(mod).encode()
+    raise ValueError('Unknown output kind "%s"' % kind)
+
+
+def _object(mod, level):
+    ''' Emits the object of the module '''
+    # Position independent, to be linked into PIE executables
+    return target_machine(level, reloc='pic', codemodel='default') \
+        .emit_object(mod)
+
+
+# Lines of IR, about one per instruction, of each partition of the objects
+# of big modules
+PARTITION_SIZE = 2000
+
+
+def partitions(text, size=PARTITION_SIZE):
+    '''
+    Splits the functions defined in the text of a module, in order, into
+    lists of names of about `size` lines each. A single list for modules of
+    less than one and a half times `size` lines.
+    '''
+    counts = {}
+    name = None
+    for line in text.splitlines():
+        if name is not None:
+            counts[name] += 1
+            if line == '}':
+                name = None
+        elif line.startswith('define '):
+            name = _defined(line)
+            counts[name] = 0
+    total = sum(counts.values())
+    count = max(1, min(len(counts), round(total / size)))
+    if count == 1:
+        return [list(counts)]
+    result = [[] for _ in range(count)]
+    done = 0
+    for name, lines in counts.items():
+        # By the middle of the function, so a big one after small ones
+        # still gets a partition of its own
+        result[(2 * done + lines) * count // (2 * total)].append(name)
+        done += lines
+    return [names for names in result if names]
+
+
+def emit_object(mod, level='0', jobs=1):
+    '''
+    Emits the object of the optimized module.
+
+    Machine code generation is most of the time of an optimized build after
+    the optimizer, which runs on the whole module to inline across its
+    functions. So modules of several `partitions` are emitted one object per
+    partition, in a pool of `jobs` processes (0 is one per CPU), and the
+    objects are linked into one by `link_objects`. Each partition defines
+    its functions and declares the others. The partitions do not depend on
+    the number of processes, and neither does the output.
+
+    The internal symbols of partitioned modules are exported and renamed,
+    see `_export`, so the module should not be used afterwards.
+    '''
+    text = str(mod)
+    parts = partitions(text, PARTITION_SIZE)
+    if len(parts) == 1:
+        return _object(mod, level)
+    names = _export(mod, hashlib.sha256(text.encode()).hexdigest()[:16])
+    text = str(mod)
+    args = [(text, [names.get(name, name) for name in part], i == 0, level)
+            for i, part in enumerate(parts)]
+    if jobs == 1:
+        objects = [_emit_partition(arg) for arg in args]
+    else:
+        with Pool(min(jobs or os.cpu_count(), len(args))) as pool:
+            objects = pool.map(_emit_partition, args, chunksize=1)
+    return link_objects(objects)
+
+
+def _export(mod, digest):
+    '''
+    Makes the internal and private functions and variables hidden globals,
+    so the partitions may refer to each other's. They are renamed after the
+    digest of the module, as the objects of other modules may be linked
+    with them.
+
+    Returns:
+        Dict of the new names by old name.
+    '''
+    names = {}
+    for value in chain(mod.functions, mod.global_variables):
+        if value.linkage in (llvm.Linkage.internal, llvm.Linkage.private):
+            value.linkage = 'external'
+            value.visibility = 'hidden'
+            names[value.name] = value.name = '%s.%s' % (value.name, digest)
+    return names
+
+
+# Name of the function of a `define` line of LLVM IR
+DEFINE = re.compile(r'@("[^"]*"|[-\w$.]+)\(')
+
+
+def _defined(line):
+    ''' Name of the function defined by the line '''
+    return DEFINE.search(line).group(1).strip('"')
+
+
+def _emit_partition(args):
+    '''
+    Emits the object of a partition, given the text of the module, the names
+    of its functions, if it owns the global variables and the level.
+    '''
+    text, names, owner, level = args
+    names = set(names)
+    lines = []
+    body = False
+    # The functions of the other partitions are declared, which is cheaper
+    # than making them available_externally, as those are still compiled
+    for line in text.splitlines():
+        if body:
+            body = line != '}'
+            continue
+        if line.startswith('define ') and _defined(line) not in names:
+            line = 'declare ' + line[len('define '):].rstrip(' {')
+            body = True
+        lines.append(line)
+    mod = llvm.parse_assembly('\n'.join(lines))
+    if not owner:
+        for var in mod.global_variables:
+            if not var.is_declaration:
+                var.linkage = 'available_externally'
+    return _object(mod, level)
+
+
+def link_objects(objects):
+    '''
+    Links the object files into one (a partial link, `$CC -r`). Returns the
+    bytes of the object.
+    '''
+    with tempfile.TemporaryDirectory() as path:
+        files = []
+        for i, data in enumerate(objects):
+            files.append(os.path.join(path, 'part%d.o' % i))
+            with open(files[-1], 'wb') as f:
+                f.write(data)
+        output = os.path.join(path, 'out.o')
+        command = [os.environ.get('CC', 'cc'), '-r', '-nostdlib', *files,
+                   '-o', output]
+        subprocess.run(command, check=True)
+        with open(output, 'rb') as f:
+            return f.read()
+
+
+def link(objects, output):
+    '''
+    Links the object files into an executable with the system C compiler
+    driver (`$CC`, or `cc`).
+    '''
+    command = [os.environ.get('CC', 'cc'), *objects, '-o', output]
+    subprocess.run(command, check=True)
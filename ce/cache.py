@@ -0,0 +1,162 @@
+import os
+import json
+import fcntl
+import hashlib
+import threading
+from functools import lru_cache
+
+
+def cache_dir(*parts):
+    '''
+    Returns a directory inside the user cache dir, creating it if needed.
+
+    The base directory is `$CE_CACHE_DIR` when set, otherwise
+    `$XDG_CACHE_HOME/ce` (defaults to `~/.cache/ce`).
+
+    Args:
+        parts: Sub directories inside the base cache dir.
+
+    Returns:
+        The absolute path of the directory.
+    '''
+    base = os.environ.get('CE_CACHE_DIR')
+    if not base:
+        home = os.path.expanduser('~/.cache')
+        base = os.path.join(os.environ.get('XDG_CACHE_HOME') or home, 'ce')
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@lru_cache(maxsize=None)
+def compiler_version():
+    ''' Hash of the compiler sources, so any change invalidates the caches '''
+    root = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for directory, _, files in sorted(os.walk(root)):
+        for name in sorted(files):
+            if not name.endswith('.py') or name == 'parsetab.py':
+                continue
+            path = os.path.join(directory, name)
+            digest.update(os.path.relpath(path, root).encode())
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def file_digest(filename):
+    ''' SHA-256 of the file contents, read in chunks '''
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DiskCache(object):
+    '''
+    Content addressed cache of blobs in the user cache dir.
+
+    Entries are files named after their key. Reading an entry updates its
+    modification time, and the least recently used entries are removed once
+    the cache grows over `limit` bytes. Hits and misses are kept in
+    `stats.json`, counted under a lock on `stats.lock`, so the counts of
+    compilers running at the same time are not lost.
+    '''
+    STATS = 'stats.json'
+    LOCK = 'stats.lock'
+
+    def __init__(self, name, limit=256 * 1024 * 1024):
+        super(DiskCache, self).__init__()
+        self.path = cache_dir(name)
+        self.limit = limit
+        # Counts of the threads of a process are not lost
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts):
+        ''' Key for the given str parts '''
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key):
+        ''' Returns the bytes stored for the key, or None '''
+        path = os.path.join(self.path, key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return data
+
+    def put(self, key, data):
+        ''' Stores the bytes for the key, evicting old entries if needed '''
+        self._write(key, data)
+        self.evict()
+
+    def entries(self):
+        ''' Returns the (mtime, size, path) of every entry '''
+        result = []
+        for entry in os.scandir(self.path):
+            if entry.name in (self.STATS, self.LOCK) or \
+                    entry.name.endswith('.tmp'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            result.append((stat.st_mtime, stat.st_size, entry.path))
+        return result
+
+    def evict(self):
+        ''' Removes the least recently used entries over the limit '''
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.limit:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        ''' Returns the hits, misses, number of entries and bytes used '''
+        entries = self.entries()
+        stats = {'hits': 0, 'misses': 0}
+        stats.update(self._stats())
+        stats['entries'] = len(entries)
+        stats['bytes'] = sum(size for _, size, _ in entries)
+        stats['limit'] = self.limit
+        return stats
+
+    def _stats(self):
+        try:
+            with open(os.path.join(self.path, self.STATS)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _count(self, name):
+        # The stats file is replaced on each write, so the lock is another
+        # file. It is released when closed
+        with self.lock, open(os.path.join(self.path, self.LOCK), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            stats = self._stats()
+            stats[name] = stats.get(name, 0) + 1
+            self._write(self.STATS, json.dumps(stats).encode())
+
+    def _write(self, name, data):
+        ''' Writes the file atomically '''
+        path = os.path.join(self.path, name)
+        tmp = '%s.%d-%d.tmp' % (path, os.getpid(), threading.get_ident())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
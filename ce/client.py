@@ -0,0 +1,212 @@
+'''
+Client of the compile server of `ce.server`.
+
+Only imports the standard library, so it starts fast, and forwards the
+request to the server, which keeps the compiler warm:
+
+    $ python main.py --serve &
+    $ python -m ce.client -f example.ce -O2 -o out.o
+
+The protocol is one line of JSON per request, such as
+`{"command": "compile", "file": "/abs/example.ce", "kind": "obj",
+"options": {"opt": "2"}}`. The response is one line of JSON, with the
+`status` and the `size` of the output, followed by `size` bytes of output.
+Errors have the status "error" and their message in `error`.
+'''
+import os
+import sys
+import json
+import stat
+import socket
+import struct
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+
+
+# Size of the reads of the output streamed back
+CHUNK_SIZE = 1 << 16
+
+# Kinds of output by extension of the output file, as in main.py
+EXTENSIONS = {'.ll': 'ir', '.ir': 'ir', '.bc': 'bc', '.s': 'asm', '.o': 'obj'}
+
+
+def socket_path():
+    '''
+    Path of the socket: `$CE_SOCKET`, or `ce.sock` in `$XDG_RUNTIME_DIR` or
+    in a directory of the user in the temp dir, see `private_dir`.
+    '''
+    if os.environ.get('CE_SOCKET'):
+        return os.environ['CE_SOCKET']
+    path = os.environ.get('XDG_RUNTIME_DIR')
+    if not path:
+        path = private_dir(os.path.join(tempfile.gettempdir(),
+                                        'ce-%d' % os.getuid()))
+    return os.path.join(path, 'ce.sock')
+
+
+def private_dir(path):
+    '''
+    Creates the directory, only accessible by the user, and returns it.
+
+    Raises:
+        PermissionError when it already exists but is not a directory of the
+        user that only the user may access, as others could bind the socket.
+    '''
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or \
+            info.st_mode & 0o077:
+        raise PermissionError('%s must be a directory only the user may '
+                              'access' % path)
+    return path
+
+
+def check_peer(sock):
+    '''
+    Checks that the server at the other end of the socket runs as the user,
+    where the system tells (Linux `SO_PEERCRED`).
+
+    Raises:
+        PermissionError otherwise.
+    '''
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return
+    credentials = sock.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    _, uid, _ = struct.unpack('3i', credentials)
+    if uid != os.getuid():
+        raise PermissionError('The server is run by another user (uid %d)'
+                              % uid)
+
+
+def request(message, output=None, path=None):
+    '''
+    Sends a request to the server.
+
+    Args:
+        message: Dict with the request.
+        output: Binary file the output is streamed to. Discarded if None.
+        path: Socket of the server, see `socket_path`.
+
+    Returns:
+        The dict with the header of the response.
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path or socket_path())
+        check_peer(sock)
+        sock.sendall(json.dumps(message).encode() + b'\n')
+        with sock.makefile('rb') as response:
+            header = json.loads(response.readline())
+            left = header.get('size', 0)
+            while left > 0:
+                chunk = response.read(min(left, CHUNK_SIZE))
+                if not chunk:
+                    raise ConnectionError('Truncated response')
+                left -= len(chunk)
+                if output is not None:
+                    output.write(chunk)
+    return header
+
+
+def exit_status(value):
+    '''
+    Exit status for the value returned by main, as for a C program: the
+    integer, of which only the low 8 bits reach the shell. So integers out of
+    0 to 255 are also printed, as are booleans and floating point values,
+    which exit with 0.
+    '''
+    if isinstance(value, bool):
+        print('concordo' if value else 'discordo')
+        return 0
+    if not isinstance(value, int):
+        print(value)
+        return 0
+    if not 0 <= value <= 255:
+        print(value)
+    return value & 0xFF
+
+
+def create_argparse():
+    ''' Creates the argument parser, with the options of main.py '''
+    arg_parser = ArgumentParser(description='Compile with the server')
+    arg_parser.add_argument('--file', '-f', required=True)
+    arg_parser.add_argument('--socket', help='Socket of the server')
+    arg_parser.add_argument('--check', action='store_true',
+                            help='Only validate the file')
+    arg_parser.add_argument('--run', action='store_true',
+                            help='Run main in the server and exit with it')
+    arg_parser.add_argument('--ssa', action='store_true')
+    arg_parser.add_argument('-O', dest='opt', default='0')
+    arg_parser.add_argument('--no-fold', dest='fold', action='store_false')
+    arg_parser.add_argument('--ctfe', type=int, nargs='?', const=100000,
+                            default=0, metavar='STEPS')
+    arg_parser.add_argument('--bounds-check', dest='checks',
+                            action='store_true')
+    arg_parser.add_argument('--tail-loops', action='store_true')
+    arg_parser.add_argument('--passes', type=lambda x: x.split(','),
+                            default=[])
+    arg_parser.add_argument('--output', '-o')
+    arg_parser.add_argument('--emit',
+                            choices=('ir', 'bc', 'asm', 'obj', 'exe'))
+    return arg_parser
+
+
+def output_kind(args):
+    ''' Kind of output requested by --emit or the extension of --output '''
+    if args.emit is not None:
+        return args.emit
+    if args.output is None:
+        return 'ir'
+    _, extension = os.path.splitext(args.output)
+    return EXTENSIONS.get(extension, 'exe')
+
+
+def main(args):
+    ''' Forwards the request of the args. Returns the exit status '''
+    message = {
+        'command': 'check' if args.check else 'run' if args.run else
+                   'compile',
+        'file': os.path.abspath(args.file),
+        'options': {
+            'ssa': args.ssa, 'opt': args.opt, 'passes': args.passes,
+            'fold': args.fold, 'ctfe': args.ctfe, 'checks': args.checks,
+            'tail_loops': args.tail_loops,
+        },
+    }
+    kind = output_kind(args)
+    message['kind'] = 'obj' if kind == 'exe' else kind
+
+    if kind == 'exe':
+        # Linked here, with $CC, as backend.link does
+        with tempfile.TemporaryDirectory() as path:
+            obj = os.path.join(path, 'out.o')
+            with open(obj, 'wb') as f:
+                header = request(message, f, args.socket)
+            if header['status'] == 'ok':
+                command = [os.environ.get('CC', 'cc'), obj, '-o',
+                           args.output or 'a.out']
+                subprocess.run(command, check=True)
+    elif args.output is not None:
+        with open(args.output, 'wb') as f:
+            header = request(message, f, args.socket)
+    else:
+        header = request(message, sys.stdout.buffer, args.socket)
+        sys.stdout.flush()
+
+    if header['status'] != 'ok':
+        print(header['error'], file=sys.stderr)
+        return 1
+    if args.run:
+        return exit_status(header['value'])
+    return 0
+
+
+#
+# Scripting part
+#
+if __name__ == '__main__':
+    sys.exit(main(create_argparse().parse_args()))
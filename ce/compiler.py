@@ -0,0 +1,282 @@
+from collections import namedtuple
+
+import llvmlite.binding as llvm
+
+from ce import backend
+from ce.cache import compiler_version, file_digest
+from ce.ctfe import Evaluator
+from ce.lexer import TokenStream, lexer, tokenize, tokenize_file
+from ce.parser import create_parser
+from ce.semantic.node import walk
+
+
+# Options that change the output
+# ctfe is the step budget of each call evaluated at compile time, 0 is off.
+# checks checks the bounds of array accesses. tail_loops rewrites self tail
+# calls into loops
+Options = namedtuple(
+    'Options',
+    ['ssa', 'opt', 'passes', 'fold', 'ctfe', 'checks', 'tail_loops'])
+Options.__new__.__defaults__ = (False, '0', (), True, 0, False, False)
+
+
+def parse(filename, debug=False, session=None):
+    '''
+    Parses the passed filename, streaming its tokens, with the lexer and
+    parser of the `Session`. Creates one unless given.
+    '''
+    if session is None:
+        session = Session(debug=debug)
+    return session.parse_file(filename)
+
+
+def prepare(tree, options=Options()):
+    '''
+    Validates and folds the tree. Calls of pure functions with constant args
+    are evaluated while folding if `options.ctfe` is set.
+    '''
+    tree.validate(options.checks)
+    if options.fold:
+        tree.fold(Evaluator(options.ctfe) if options.ctfe else None)
+    return tree
+
+
+def lower(tree, options=Options()):
+    ''' Validates and folds the tree and returns its `ir.Module` '''
+    return prepare(tree, options).generate(options.tail_loops)
+
+
+def generate(tree, options=Options(), report=None, loops=None):
+    '''
+    Validates the tree and returns its LLVM IR, optimized as set in options.
+
+    Args:
+        tree: Parse tree.
+        options: `Options`.
+        report: Optional dict, filled with the instruction counts of each
+            function as (before, after) optimization.
+        loops: Optional dict, filled with the vectorization width of each
+            loop, see `backend.loops`. None for loops removed by the
+            optimizations.
+    '''
+    if options.ssa or options.opt != '0' or options.passes or \
+            report is not None or loops is not None:
+        return str(optimize(lower(tree, options), options, report, loops))
+
+    # remove first 3 lines of module
+    module = str(lower(tree, options))
+    return module.split('\n', 3)[3]
+
+
+def optimize(module, options=Options(), report=None, loops=None):
+    ''' Parses the generated module and optimizes it. Same args as generate '''
+    return _optimize(backend.parse(module), options, report, loops)
+
+
+def _optimize(mod, options, report=None, loops=None):
+    ''' Optimizes the `llvm.ModuleRef`, in place '''
+    before = backend.instruction_counts(mod)
+    names = backend.loops(mod) if loops is not None else {}
+    if options.ssa:
+        backend.promote(mod)
+    backend.optimize(mod, options.opt, options.passes)
+    if report is not None:
+        after = backend.instruction_counts(mod)
+        for name, count in before.items():
+            report[name] = (count, after.get(name, 0))
+    if loops is not None:
+        widths = backend.loops(mod)
+        for name in names:
+            loops[name] = widths.get(name)
+    return mod
+
+
+def run(tree, options=Options()):
+    '''
+    JIT compiles the tree in-process and calls its main function.
+
+    Returns:
+        The value returned by main.
+    '''
+    mod = optimize(lower(tree, options), options)
+    return backend.run(mod, options.opt)
+
+
+def emit(tree, options=Options(), kind='ir', jobs=1):
+    '''
+    Compiles the tree to one of `backend.KINDS`. Objects of big modules
+    are emitted in jobs processes, see `backend.emit_object`.
+
+    Returns:
+        The bytes of the output. Text IR is the same as `generate`.
+    '''
+    if kind == 'ir':
+        return generate(tree, options).encode()
+    mod = optimize(lower(tree, options), options)
+    return backend.emit(mod, kind, options.opt, jobs)
+
+
+def compile_file(filename, options=Options(), cache=None, debug=False,
+                 kind='ir', jobs=1, session=None):
+    '''
+    Compiles the file.
+
+    Args:
+        filename: Source file.
+        options: `Options`. Part of the cache key.
+        cache: Optional `DiskCache`. The output is looked up by the hash of
+            the source, the compiler version, the options and the kind.
+        debug: Rebuilds the parser tables.
+        kind: Output, one of `backend.KINDS`.
+        jobs: Processes emitting an object, 0 one per CPU. The output is
+            the same, thus it is not part of the cache key.
+        session: `Session` parsing the file, see `parse`.
+
+    Returns:
+        The bytes of the output.
+    '''
+    if cache is None:
+        return emit(parse(filename, debug, session), options, kind, jobs)
+
+    key = cache.key(
+        file_digest(filename), compiler_version(), repr(options), kind)
+    output = cache.get(key)
+    if output is not None:
+        return output
+    output = emit(parse(filename, debug, session), options, kind, jobs)
+    cache.put(key, output)
+    return output
+
+
+def compile_timed(filename, phases, options=Options(), kind='ir',
+                  debug=False, jobs=1):
+    '''
+    Compiles the file, as `compile_file` without cache, measuring
+    each phase in the `ce.phases.Phases`: lex, parse, validate, fold, generate,
+    serialize (the text of the module), verify (parsed by LLVM), optimize
+    and emit. The file is lexed before it is parsed, rather than streamed,
+    to tell both phases apart.
+
+    Returns:
+        The bytes of the output.
+    '''
+    session = Session(debug=debug)
+    with phases.phase('lex'):
+        tokens = list(tokenize_file(filename, scanner=session.lexer))
+    with phases.phase('parse'):
+        tree = session.parser.parse(lexer=TokenStream(iter(tokens)))
+    del tokens
+    phases.nodes = sum(1 for _ in walk(tree))
+
+    with phases.phase('validate'):
+        tree.validate(options.checks, phases)
+    if options.fold:
+        with phases.phase('fold'):
+            evaluator = Evaluator(options.ctfe) if options.ctfe else None
+            tree.fold(evaluator, phases)
+    with phases.phase('generate'):
+        module = tree.generate(options.tail_loops, phases)
+    with phases.phase('serialize'):
+        text = str(module)
+    with phases.phase('verify'):
+        mod = backend.parse(text)
+    optimized = options.ssa or options.opt != '0' or options.passes
+    if optimized:
+        with phases.phase('optimize'):
+            _optimize(mod, options)
+    phases.instructions = backend.instruction_counts(mod)
+
+    with phases.phase('emit'):
+        if kind != 'ir':
+            return backend.emit(mod, kind, options.opt, jobs)
+        if optimized:
+            return str(mod).encode()
+        # As generate, without the first 3 lines of the module
+        return text.split('\n', 3)[3].encode()
+
+
+def link_files(filenames, options=Options(), cache=None, debug=False,
+               kind='obj', jobs=1):
+    '''
+    Compiles the files as one program, with link time optimization.
+
+    Each file is compiled to bitcode without optimizing it, and cached as
+    in `compile_file`. The units are linked into one module, whose
+    definitions are internalized, but main, and which is optimized as set
+    in options. Thus calls across files may be inlined.
+
+    Returns:
+        The bytes of the output, one of `backend.KINDS`.
+    '''
+    unit = options._replace(opt='0', passes=())
+    mod = None
+    for filename in filenames:
+        bitcode = compile_file(filename, unit, cache, debug, 'bc')
+        if mod is None:
+            mod = llvm.parse_bitcode(bitcode)
+        else:
+            mod.link_in(llvm.parse_bitcode(bitcode))
+    backend.internalize(mod)
+    mod = _optimize(mod, options)
+    return backend.emit(mod, kind, options.opt, jobs)
+
+
+class Session(object):
+    '''
+    Compiler session, owning the lexer and parser it parses with.
+
+    PLY lexers and parsers keep the state of the text they work on, so they
+    may not be shared by threads. Unlike `ce.parser.p_error`, which prints
+    syntax errors and lets PLY recover, the parser of a session raises
+    SyntaxError. The trees validate in `Scopes` of their
+    own and generate `ir.Module`s of their own, and llvmlite serializes the
+    calls into LLVM. Thus threads may compile at the same time, each with
+    its session.
+
+    Args:
+        cache: Optional `DiskCache` of `compile_file`.
+        debug: Rebuilds the parser tables.
+    '''
+
+    def __init__(self, cache=None, debug=False):
+        super(Session, self).__init__()
+        self.cache = cache
+        self.debug = debug
+        self.lexer = lexer.clone()
+        self.parser = create_parser(debug=debug, cache=not debug)
+        self.parser.errorfunc = _syntax_error
+
+    def parse(self, source):
+        ''' Parses the source text '''
+        tokens = TokenStream(tokenize(source, scanner=self.lexer))
+        return self.parser.parse(lexer=tokens)
+
+    def parse_file(self, filename):
+        ''' Parses the file, streaming its tokens '''
+        tokens = TokenStream(tokenize_file(filename, scanner=self.lexer))
+        return self.parser.parse(lexer=tokens)
+
+    def check(self, source, options=Options()):
+        ''' Validates and folds the source. Returns its tree '''
+        return prepare(self.parse(source), options)
+
+    def compile(self, source, options=Options(), kind='ir'):
+        ''' Compiles the source text, see `emit` '''
+        return emit(self.parse(source), options, kind)
+
+    def compile_file(self, filename, options=Options(), kind='ir'):
+        ''' Compiles the file, see `compile_file` '''
+        return compile_file(filename, options, self.cache, self.debug, kind,
+                            session=self)
+
+    def run(self, source, options=Options()):
+        ''' JIT compiles the source and returns the value of its main '''
+        return run(self.parse(source), options)
+
+
+def _syntax_error(tok):
+    ''' Error function of the parsers of the sessions '''
+    if tok is None:
+        raise SyntaxError('Unexpected end of file')
+    raise SyntaxError('Error at line %d, position %d: unexpected "%s"' % (
+        tok.lineno, tok.lexpos, tok.value))
@@ -0,0 +1,123 @@
+from ce.types import Types, NUMERIC_TYPES, cast_value
+
+
+# Steps each call evaluated at compile time may take
+STEPS = 100000
+
+# Nested calls each call evaluated at compile time may make
+DEPTH = 100
+
+
+class NotConstant(Exception):
+    ''' The node can not be evaluated at compile time '''
+    pass
+
+
+class Returned(Exception):
+    ''' Unwinds the evaluation of a function up to its call '''
+
+    def __init__(self, value, typ):
+        super(Returned, self).__init__()
+        self.value = value
+        self.type = typ
+
+
+class Evaluator(object):
+    '''
+    Evaluates calls of functions at compile time (CTFE).
+
+    Nodes are evaluated by their `evaluate` method. The values of the
+    variables of each call live in a frame, keyed by their `DeclVariable`.
+    Reading or writing any other variable, such as a global, raises
+    NotConstant, and so does anything the evaluator does not model: arrays,
+    strings, calls of void functions and going over the step budget. Thus
+    only pure functions are evaluated, and their results are memoized.
+    '''
+
+    def __init__(self, steps=STEPS, depth=DEPTH):
+        super(Evaluator, self).__init__()
+        self.steps = steps
+        self.depth = depth
+        self.frames = []
+        self.results = {}
+        self._left = 0
+
+    def call(self, call):
+        '''
+        Evaluates the validated `Call`, whose args must be literals.
+
+        Returns:
+            The value, or None when it can not be evaluated.
+        '''
+        self._left = self.steps
+        self.frames = []
+        try:
+            return self.invoke(call.function, [
+                cast_value(param.type, arg.type, arg.value)
+                for param, arg in zip(call.function.args, call.args)
+            ])
+        except (NotConstant, RecursionError, ArithmeticError, TypeError,
+                ValueError):
+            return None
+
+    def invoke(self, function, values):
+        ''' Evaluates the function with the values of its args '''
+        if function.type not in NUMERIC_TYPES and \
+                function.type != Types.BOOLEAN or function.block is None:
+            raise NotConstant(function.name)
+        key = (function, tuple(values))
+        if key in self.results:
+            return self.results[key]
+        if len(self.frames) >= self.depth:
+            raise NotConstant(function.name)
+
+        self.step()
+        self.frames.append(dict(zip(function.args, values)))
+        try:
+            function.block.evaluate(self)
+        except Returned as returned:
+            value = cast_value(function.type, returned.type, returned.value)
+            self.results[key] = value
+            return value
+        finally:
+            self.frames.pop()
+        # No return
+        raise NotConstant(function.name)
+
+    def step(self):
+        ''' Spends one step of the budget '''
+        self._left -= 1
+        if self._left < 0:
+            raise NotConstant('Out of steps')
+
+    def declare(self, decl):
+        ''' Declares the local variable, keeping its value if any '''
+        self.frames[-1].setdefault(decl, None)
+
+    def __getitem__(self, decl):
+        value = self.frames[-1].get(decl)
+        if value is None:
+            raise NotConstant(decl.name)
+        return value
+
+    def __setitem__(self, decl, value):
+        frame = self.frames[-1]
+        if decl not in frame:
+            raise NotConstant(decl.name)
+        frame[decl] = value
+
+
+def constant(expr):
+    '''
+    Evaluates the validated expression without changing it, if it is made
+    only of literals: no variables nor calls are evaluated.
+
+    Returns:
+        The value, or None when it is not a constant.
+    '''
+    evaluator = Evaluator(steps=0)
+    evaluator.frames.append({})
+    try:
+        return expr.evaluate(evaluator)
+    except (NotConstant, ArithmeticError, TypeError, ValueError):
+        return None
@@ -0,0 +1,327 @@
+from collections import deque
+
+from ce.lexer import TokenArray
+
+from ce.semantic.expressions import OpBin, OpUn
+from ce.semantic.values import Call, Var, Assign, Literal
+from ce.semantic.declarations import DeclVariable, DeclFunction
+from ce.semantic.statements import Block, If, For, While, Switch, Case, Main, \
+    Return, Hint
+
+from ce.types import Types, OpTypes
+
+
+# Binary operators by precedence level. Same as `ce.parser.precedence`
+LEVELS = {
+    'OP_GE': 1, '<': 1, 'OP_LE': 1, '>': 1, 'OP_EQ': 1, 'OP_NE': 1,
+    '&': 2, '|': 2, '^': 2,
+    '+': 3, '-': 3,
+    '*': 4, '/': 4, '%': 4,
+}
+
+TYPES = {
+    'VOID': Types.VOID,
+    'CHAR': Types.CHAR,
+    'STRING': Types.STRING,
+    'SHORT': Types.SHORT,
+    'INT': Types.INT,
+    'LONG': Types.LONG,
+    'FLOAT': Types.FLOAT,
+    'DOUBLE': Types.DOUBLE,
+    'BOOLEAN': Types.BOOLEAN,
+}
+
+LITERALS = {
+    'LITERAL_INT': Types.INT,
+    'LITERAL_FLOAT': Types.FLOAT,
+    'LITERAL_CHAR': Types.CHAR,
+    'LITERAL_STRING': Types.STRING,
+}
+
+
+class Parser(object):
+    '''
+    Hand written recursive descent parser.
+
+    Statements are parsed by recursive descent and expressions by precedence
+    climbing. Builds the same tree as the PLY grammar in `ce.parser`, but
+    raises SyntaxError on the first error instead of recovering.
+    '''
+
+    def __init__(self):
+        super(Parser, self).__init__()
+        self._next = None
+        self._ahead = deque()
+
+    def parse(self, input=None, lexer=None, tokenfunc=None, **kwargs):
+        '''
+        Parses the input. Same arguments as the PLY parser: tokens are taken
+        from `tokenfunc`, or else from `lexer`, or else by lexing `input`.
+        '''
+        if tokenfunc is None:
+            if input is not None:
+                tokenfunc = TokenArray(input).stream().token
+            else:
+                tokenfunc = lexer.token
+        self._next = tokenfunc
+        self._ahead.clear()
+
+        if self._peek() is None:
+            return Main()
+        commands = []
+        while self._peek() is not None:
+            commands.append(self._command())
+        return Main(commands)
+
+    #
+    # Tokens
+    #
+    def _peek(self, n=0):
+        ''' Type of the token `n` positions ahead, None at the end '''
+        while len(self._ahead) <= n:
+            self._ahead.append(self._next())
+        tok = self._ahead[n]
+        return None if tok is None else tok.type
+
+    def _take(self, typ=None):
+        ''' Consumes the next token, which must be of type `typ` if given '''
+        if typ is not None and self._peek() != typ:
+            self._error()
+        self._peek()
+        return self._ahead.popleft()
+
+    def _accept(self, typ):
+        ''' Consumes the next token if it is of type `typ` '''
+        if self._peek() == typ:
+            return self._ahead.popleft()
+        return None
+
+    def _error(self):
+        self._peek()
+        raise SyntaxError('Error at %s' % self._ahead[0])
+
+    #
+    # Commands and statements
+    #
+    def _command(self):
+        if self._peek() in TYPES and self._peek(2) == '(':
+            return self._function()
+        command = self._simple()
+        self._take(';')
+        return command
+
+    def _simple(self):
+        ''' Variable declaration, assignment or expression '''
+        if self._peek() in TYPES:
+            return self._declaration()
+        if self._peek() == 'ID' and self._peek(1) in ('=', '['):
+            name = self._take().value
+            dims = self._array() if self._peek() == '[' else None
+            if self._accept('='):
+                var = Var(name) if dims is None else Var(name, dims)
+                return Assign(var, self._expression())
+            return self._expression(left=self._postfix(name, dims))
+        return self._expression()
+
+    def _declaration(self):
+        typ = self._type()
+        name = self._take('ID').value
+        if self._accept('='):
+            return DeclVariable(typ, name, self._expression())
+        if self._peek() == '[':
+            return DeclVariable(typ, name, dims=self._array())
+        return DeclVariable(typ, name)
+
+    def _assign(self):
+        name = self._take('ID').value
+        if self._peek() == '[':
+            var = Var(name, self._array())
+        else:
+            var = Var(name)
+        self._take('=')
+        return Assign(var, self._expression())
+
+    def _array(self):
+        dims = []
+        while self._accept('['):
+            dims.append(self._expression())
+            self._take(']')
+        return dims
+
+    def _function(self):
+        typ = self._type()
+        name = self._take('ID').value
+        self._take('(')
+        args = []
+        if not self._accept(')'):
+            args.append(self._argument())
+            while self._accept(','):
+                args.append(self._argument())
+            self._take(')')
+        # Prototype
+        block = None if self._accept(';') else self._block()
+        if not args:
+            return DeclFunction(typ, name, block=block)
+        return DeclFunction(typ, name, args=args, block=block)
+
+    def _argument(self):
+        typ = self._type()
+        name = self._take('ID').value
+        if self._peek() == '[':
+            return DeclVariable(typ, name, dims=self._array())
+        return DeclVariable(typ, name)
+
+    def _type(self):
+        if self._peek() not in TYPES:
+            self._error()
+        return TYPES[self._take().type]
+
+    def _block(self):
+        self._take('{')
+        if self._accept('}'):
+            return Block()
+        statements = []
+        while not self._accept('}'):
+            statements.append(self._statement())
+        return Block(statements)
+
+    def _statement(self):
+        typ = self._peek()
+        if typ == 'IF':
+            return self._if()
+        if typ == 'FOR':
+            return self._for()
+        if typ == 'WHILE':
+            return self._while()
+        if typ == '@':
+            hints = self._hints()
+            if self._peek() == 'FOR':
+                return self._for(hints)
+            if self._peek() == 'WHILE':
+                return self._while(hints)
+            self._error()
+        if typ == 'SWITCH':
+            return self._switch()
+        if typ == 'RETURN':
+            statement = self._return()
+        else:
+            statement = self._simple()
+        self._take(';')
+        return statement
+
+    def _condition(self):
+        ''' Parenthesized expression '''
+        self._take('(')
+        expr = self._expression()
+        self._take(')')
+        return expr
+
+    def _if(self):
+        self._take('IF')
+        expr = self._condition()
+        block = self._block()
+        if self._accept('ELSE'):
+            return If(expr, block, self._block())
+        return If(expr, block)
+
+    def _hints(self):
+        hints = []
+        while self._accept('@'):
+            name = self._take('ID').value
+            if self._accept('('):
+                hints.append(Hint(name, self._take('LITERAL_INT').value))
+                self._take(')')
+            else:
+                hints.append(Hint(name))
+        return hints
+
+    def _for(self, hints=()):
+        self._take('FOR')
+        self._take('(')
+        decl = self._declaration()
+        self._take(';')
+        cond = self._expression()
+        self._take(';')
+        step = self._assign()
+        self._take(')')
+        return For(decl, cond, step, self._block(), hints)
+
+    def _while(self, hints=()):
+        self._take('WHILE')
+        expr = self._condition()
+        return While(expr, self._block(), hints)
+
+    def _switch(self):
+        self._take('SWITCH')
+        expr = self._condition()
+        self._take('{')
+        cases = [self._case()]
+        while self._peek() == 'CASE':
+            cases.append(self._case())
+        if self._accept('ELSE'):
+            default = self._block()
+            self._take('}')
+            return Switch(expr, cases, default)
+        self._take('}')
+        return Switch(expr, cases)
+
+    def _case(self):
+        self._take('CASE')
+        expr = self._condition()
+        return Case(expr, self._block())
+
+    def _return(self):
+        self._take('RETURN')
+        if self._peek() == ';':
+            return Return()
+        return Return(self._expression())
+
+    #
+    # Expressions
+    #
+    def _expression(self, level=1, left=None):
+        ''' Precedence climbing. All binary operators are left associative '''
+        if left is None:
+            left = self._unary()
+        while LEVELS.get(self._peek(), 0) >= level:
+            op = self._take()
+            right = self._expression(LEVELS[op.type] + 1)
+            left = OpBin(left, OpTypes(op.value), right)
+        return left
+
+    def _unary(self):
+        if self._accept('-'):
+            return OpUn(OpTypes.SUB, self._unary())
+        return self._primary()
+
+    def _primary(self):
+        typ = self._peek()
+        if typ == '(':
+            return self._condition()
+        if typ == 'ID':
+            name = self._take().value
+            dims = self._array() if self._peek() == '[' else None
+            return self._postfix(name, dims)
+        if typ in LITERALS:
+            return Literal(self._take().value, LITERALS[typ])
+        if typ == 'LITERAL_TRUE':
+            self._take()
+            return Literal(True, Types.BOOLEAN)
+        if typ == 'LITERAL_FALSE':
+            self._take()
+            return Literal(False, Types.BOOLEAN)
+        self._error()
+
+    def _postfix(self, name, dims):
+        ''' Variable, array access or call of the already consumed ID '''
+        if dims is not None:
+            return Var(name, dims)
+        if not self._accept('('):
+            return Var(name)
+        if self._accept(')'):
+            return Call(name)
+        params = [self._expression()]
+        while self._accept(','):
+            params.append(self._expression())
+        self._take(')')
+        return Call(name, params)
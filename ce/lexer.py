@@ -1,4 +1,8 @@
+import os
+import mmap
+import codecs
 import string
+from array import array
 
 import ply.lex as lex
 
@@ -65,6 +69,7 @@ def t_LITERAL_CHAR(t):
 def t_LITERAL_STRING(t):
     r'"[^"]*"'
     val = t.value
+    t.lexer.lineno += val.count('\n')
     t.value = str(val[1:len(val)-1]).encode()
     return t
 
@@ -103,6 +108,245 @@ def t_error(t):
 lexer = lex.lex()
 
 
+#
+# Streaming
+#
+CHUNK_SIZE = 1 << 16
+
+
+def chunks(source, size=CHUNK_SIZE):
+    '''
+    Reads the source as a sequence of text chunks.
+
+    Args:
+        source: A str, a bytes-like object (bytes, mmap, ...) with UTF-8
+            text or a file object opened in text or binary mode.
+        size: Size of each chunk.
+
+    Returns:
+        A generator of str.
+    '''
+    if isinstance(source, str):
+        for i in range(0, len(source), size):
+            yield source[i:i + size]
+        return
+
+    if hasattr(source, 'read'):
+        parts = iter(lambda: source.read(size), source.read(0))
+    else:
+        parts = (source[i:i + size] for i in range(0, len(source), size))
+
+    # Multi-byte characters may be split between two chunks
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for part in parts:
+        if isinstance(part, str):
+            yield part
+        else:
+            yield decoder.decode(part)
+    yield decoder.decode(b'', final=True)
+
+
+def tokenize(source, size=CHUNK_SIZE, scanner=None):
+    '''
+    Lazily yields the tokens of the source, reading it in chunks.
+
+    Only whole lines are lexed. Block comments and string literals that are
+    not closed at the end of the lexed text are lexed again once the next
+    chunk arrives, so they may span any number of chunks. Token positions
+    are relative to the start of the source.
+
+    Args:
+        source: Anything accepted by `chunks`.
+        size: Size of each chunk.
+        scanner: Lexer to lex with, which keeps the position while lexing,
+            such as the one of a `ce.compiler.Session`. A clone of the
+            module lexer if None.
+
+    Returns:
+        A generator of LexToken.
+    '''
+    lex = scanner or lexer.clone()
+    lex.lineno = 1
+    pending = ''
+    offset = 0
+    for chunk in chunks(source, size):
+        pending += chunk
+        end = pending.rfind('\n') + 1
+        if end == 0:
+            continue
+        consumed = yield from _lex(lex, pending[:end], offset, partial=True)
+        pending = pending[consumed:]
+        offset += consumed
+    yield from _lex(lex, pending, offset, partial=False)
+
+
+def tokenize_file(filename, size=CHUNK_SIZE, scanner=None):
+    ''' Memory maps the file and lazily yields its tokens, see `tokenize` '''
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from tokenize(data, size, scanner)
+
+
+def _lex(lex, data, offset, partial):
+    '''
+    Yields the tokens of data.
+
+    When partial, stops before an unclosed block comment or string literal
+    and returns the position it stopped at. Otherwise, returns the size of
+    data.
+    '''
+    lex.input(data)
+    for tok in iter(lex.token, None):
+        if partial and _unclosed(tok, data):
+            # Lines after the token will be counted again
+            lex.lineno = tok.lineno
+            return tok.lexpos
+        tok.lexpos += offset
+        yield tok
+    return len(data)
+
+
+def _unclosed(tok, data):
+    ''' Opening of a block comment or string that was not closed '''
+    if tok.type == '"':
+        return True
+    return tok.type == '/' and data.startswith('*', tok.lexpos + 1)
+
+
+class TokenStream(object):
+    ''' Lexer interface over a token generator, to be given to the parser '''
+
+    def __init__(self, tokens):
+        super(TokenStream, self).__init__()
+        self.tokens = tokens
+
+    def token(self):
+        return next(self.tokens, None)
+
+
+#
+# Compact tokens
+#
+class Token(object):
+    ''' Lightweight token given to the parser by `TokenArray` '''
+    __slots__ = ('type', 'value', 'lineno', 'lexpos')
+
+    def __init__(self, typ, value, lineno, lexpos):
+        self.type = typ
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+    def __repr__(self):
+        return 'Token(%s,%r,%d,%d)' % (
+            self.type, self.value, self.lineno, self.lexpos)
+
+
+class TokenArray(object):
+    '''
+    Tokens stored in parallel typed arrays.
+
+    Each token takes an entry in `kinds`, `values`, `linenos` and `offsets`.
+    Kinds and values are indexes into the `names` and `table` lists, where
+    each token type and each value is stored once.
+    '''
+
+    def __init__(self, data=''):
+        super(TokenArray, self).__init__()
+        self.kinds = array('H')
+        self.values = array('I')
+        self.linenos = array('I')
+        self.offsets = array('Q')
+        self.names = []
+        self.table = []
+        self._names = {}
+        self._table = {}
+        self.scan(data)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __iter__(self):
+        names, table = self.names, self.table
+        for kind, value, lineno, lexpos in zip(
+                self.kinds, self.values, self.linenos, self.offsets):
+            yield Token(names[kind], table[value], lineno, lexpos)
+
+    def stream(self):
+        ''' Lexer interface to be given to the parser '''
+        return TokenStream(iter(self))
+
+    def nbytes(self):
+        ''' Bytes used by the arrays, excluding the interned values '''
+        arrays = (self.kinds, self.values, self.linenos, self.offsets)
+        return sum(a.itemsize * len(a) for a in arrays)
+
+    def append(self, typ, value, lineno, lexpos):
+        kind = self._names.get(typ)
+        if kind is None:
+            kind = self._names[typ] = len(self.names)
+            self.names.append(typ)
+        # 1 == 1.0 == True, so the type is part of the key
+        key = (value.__class__, value)
+        index = self._table.get(key)
+        if index is None:
+            index = self._table[key] = len(self.table)
+            self.table.append(value)
+        self.kinds.append(kind)
+        self.values.append(index)
+        self.linenos.append(lineno)
+        self.offsets.append(lexpos)
+
+    def scan(self, data):
+        '''
+        Lexes data straight into the arrays.
+
+        Same rules as `lexer.token()`, but a single LexToken is reused for
+        the rule functions instead of allocating one per token.
+        '''
+        scanner = lexer.clone()
+        scanner.lineno = 1
+        scanner.input(data)
+        tok = lex.LexToken()
+        tok.lexer = scanner
+        append = self.append
+        ignore = scanner.lexignore
+        master = scanner.lexre
+        pos = 0
+        end = len(data)
+        while pos < end:
+            if data[pos] in ignore:
+                pos += 1
+                continue
+            for regex, functions in master:
+                m = regex.match(data, pos)
+                if not m:
+                    continue
+                func, typ = functions[m.lastindex]
+                if func is None:
+                    if typ:
+                        append(typ, m.group(), scanner.lineno, pos)
+                    pos = m.end()
+                    break
+                tok.type = typ
+                tok.value = m.group()
+                tok.lineno = scanner.lineno
+                tok.lexpos = pos
+                scanner.lexmatch = m
+                scanner.lexpos = pos = m.end()
+                if func(tok):
+                    append(tok.type, tok.value, tok.lineno, tok.lexpos)
+                break
+            else:
+                char = data[pos]
+                if char not in scanner.lexliterals:
+                    t_error(Token('error', char, scanner.lineno, pos))
+                append(char, char, scanner.lineno, pos)
+                pos += 1
+
+
 #
 # Scripting part
 #
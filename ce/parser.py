@@ -1,12 +1,20 @@
+import os
+import hashlib
+import threading
+from functools import lru_cache
+
 import ply.yacc as yacc
 
+from ce.cache import cache_dir
+from ce.descent import Parser
+
 from ce.lexer import tokens  # NOQA
 
 from ce.semantic.expressions import OpBin, OpUn
 from ce.semantic.values import Call, Var, Assign, Literal
 from ce.semantic.declarations import DeclVariable, DeclFunction
 from ce.semantic.statements import Block, If, For, While, Switch, Case, Main, \
-    Return
+    Return, Hint
 
 from ce.types import Types, OpTypes
 
@@ -44,7 +52,8 @@ def p_commands(p):
              | command
     '''
     if len(p) == 3:
-        p[0] = p[1] + [p[2]]
+        p[1].append(p[2])
+        p[0] = p[1]
     else:
         p[0] = [p[1]]
 
@@ -81,7 +90,8 @@ def p_array(p):
           | '[' expression ']'
     '''
     if len(p) == 5:
-        p[0] = p[1] + [p[3]]
+        p[1].append(p[3])
+        p[0] = p[1]
     else:
         p[0] = [p[2]]
 
@@ -97,6 +107,17 @@ def p_declaracao_funcao(p):
         p[0] = DeclFunction(p[1], p[2], block=p[5])
 
 
+def p_declaracao_funcao_prototipo(p):
+    '''
+    declaracao_funcao : TYPE ID '(' argumentos_funcao ')' ';'
+                      | TYPE ID '(' ')' ';'
+    '''
+    if len(p) == 7:
+        p[0] = DeclFunction(p[1], p[2], args=p[4], block=None)
+    else:
+        p[0] = DeclFunction(p[1], p[2], block=None)
+
+
 def p_argumentos_funcao(p):
     '''
     argumentos_funcao : argumentos_funcao ',' argumento
@@ -105,7 +126,8 @@ def p_argumentos_funcao(p):
     if len(p) == 2:
         p[0] = [p[1]]
     else:
-        p[0] = p[1] + [p[3]]
+        p[1].append(p[3])
+        p[0] = p[1]
 
 
 def p_argumento(p):
@@ -127,8 +149,7 @@ def p_assign(p):
 
 def p_assign_array(p):
     ''' assign : ID array '=' expression '''
-    dimensions = len(p[2])
-    var = Var(p[1], dimensions)
+    var = Var(p[1], p[2])
     p[0] = Assign(var, p[4])
 
 
@@ -151,7 +172,8 @@ def p_statements(p):
     if len(p) == 2:
         p[0] = [p[1]]
     else:
-        p[0] = p[1] + [p[2]]
+        p[1].append(p[2])
+        p[0] = p[1]
 
 
 def p_statement(p):
@@ -186,16 +208,57 @@ def p_for_statement(p):
     p[0] = For(p[3], p[5], p[7], p[9])
 
 
+def p_for_statement_hints(p):
+    '''
+    for_statement : hints FOR '(' var_declaration ';' expression ';' \
+                    assign ')' block
+    '''
+    p[0] = For(p[4], p[6], p[8], p[10], p[1])
+
+
 def p_while_statement(p):
     ''' while_statement : WHILE '(' expression ')' block '''
     p[0] = While(p[3], p[5])
 
 
+def p_while_statement_hints(p):
+    ''' while_statement : hints WHILE '(' expression ')' block '''
+    p[0] = While(p[4], p[6], p[1])
+
+
+def p_hints(p):
+    '''
+    hints : hints hint
+          | hint
+    '''
+    if len(p) == 3:
+        p[1].append(p[2])
+        p[0] = p[1]
+    else:
+        p[0] = [p[1]]
+
+
+def p_hint(p):
+    '''
+    hint : '@' ID '(' LITERAL_INT ')'
+         | '@' ID
+    '''
+    if len(p) == 6:
+        p[0] = Hint(p[2], p[4])
+    else:
+        p[0] = Hint(p[2])
+
+
 def p_switch_statement(p):
     '''
     switch_statement : SWITCH '(' expression ')' '{' switch_cases '}'
+                     | SWITCH '(' expression ')' '{' switch_cases ELSE \
+                       block '}'
     '''
-    p[0] = Switch(p[3], p[6])
+    if len(p) == 8:
+        p[0] = Switch(p[3], p[6])
+    else:
+        p[0] = Switch(p[3], p[6], p[8])
 
 
 def p_switch_cases(p):
@@ -204,7 +267,8 @@ def p_switch_cases(p):
                  | CASE '(' expression ')' block
     '''
     if len(p) == 7:
-        p[0] = p[1] + [Case(p[4], p[6])]
+        p[1].append(Case(p[4], p[6]))
+        p[0] = p[1]
     else:
         p[0] = [Case(p[3], p[5])]
 
@@ -259,7 +323,7 @@ def p_expression_var(p):
 
 def p_expression_array(p):
     ''' expression : ID array '''
-    p[0] = Var(p[1], len(p[2]))
+    p[0] = Var(p[1], p[2])
 
 
 def p_expression_parens(p):
@@ -284,7 +348,8 @@ def p_parameters(p):
                | expression
     '''
     if len(p) == 4:
-        p[0] = p[1] + [p[3]]
+        p[1].append(p[3])
+        p[0] = p[1]
     else:
         p[0] = [p[1]]
 
@@ -349,8 +414,59 @@ def p_error(p):
     print('Error at %s' % p)
 
 
-def create_parser(debug=True):
-    return yacc.yacc(debug=debug)
+@lru_cache(maxsize=None)
+def grammar_hash():
+    '''
+    Hashes the grammar of this module.
+
+    The hash covers the start symbol, precedence, tokens and every rule
+    docstring, plus the PLY table version. Any change to the grammar results
+    in a new hash.
+    '''
+    pinfo = yacc.ParserReflect(globals())
+    pinfo.get_all()
+    signature = yacc.__tabversion__ + pinfo.signature()
+    return hashlib.sha256(signature.encode()).hexdigest()[:16]
+
+
+def create_parser(debug=True, cache=False, backend='ply'):
+    '''
+    Creates the parser.
+
+    Args:
+        debug: Writes `parser.out` next to this module.
+        cache: Loads the LALR tables from the user cache dir, building them
+            once per grammar version. Skips the debug output and the grammar
+            validation.
+        backend: 'ply' for the LALR parser of this module or 'descent' for
+            the hand written `ce.descent.Parser`. Both build the same tree.
+
+    Returns:
+        The parser.
+    '''
+    if backend == 'descent':
+        return Parser()
+    if backend != 'ply':
+        raise ValueError('Unknown parser backend "%s"' % backend)
+
+    if not cache:
+        return yacc.yacc(debug=debug)
+
+    directory = cache_dir('tables')
+    picklefile = os.path.join(directory, 'parsetab-%s.pickle' % grammar_hash())
+    if os.path.exists(picklefile):
+        return yacc.yacc(debug=False, optimize=True, picklefile=picklefile)
+
+    # Build into a temporary file so concurrent runs never read half
+    # written tables
+    tmp = '%s.%d-%d.tmp' % (picklefile, os.getpid(), threading.get_ident())
+    try:
+        parser = yacc.yacc(debug=False, picklefile=tmp)
+        os.replace(tmp, picklefile)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return parser
 
 
 #
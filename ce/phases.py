@@ -0,0 +1,118 @@
+'''
+Wall time, CPU time and peak memory of the phases of a compilation.
+
+Memory is measured with tracemalloc, when it is tracing, so only the
+allocations of Python are seen, not those of LLVM. The peak of a phase is
+the most memory it allocated on top of the memory at its start.
+
+Tracing slows the Python phases down several times, but not LLVM, which
+skews the times. Thus peaks are measured in a compilation of their own and
+merged with `add_peaks` into the measures of an untraced one.
+'''
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+
+class Phases(object):
+    '''
+    Measures of a compilation.
+
+    Attributes:
+        phases: List of (name, wall, cpu, peak) of each phase, in order.
+            Times are in seconds and peaks in bytes, None when memory was
+            not traced.
+        functions: Dict of the steps of each function, a dict of
+            (wall, cpu, peak) by step, such as 'validate' or 'generate'.
+        nodes: Nodes of the parse tree.
+        instructions: Dict of the IR instructions of each function emitted.
+    '''
+
+    def __init__(self):
+        super(Phases, self).__init__()
+        self.phases = []
+        self.functions = {}
+        self.nodes = 0
+        self.instructions = {}
+        # Peak of each measure running, as the nested ones reset the peak
+        self._peaks = []
+
+    @contextmanager
+    def phase(self, name):
+        ''' Measures the phase run in the with block '''
+        with self._measure() as measure:
+            yield
+        self.phases.append((name,) + tuple(measure))
+
+    @contextmanager
+    def function(self, name, step):
+        ''' Measures a step of a function, inside a phase '''
+        with self._measure() as measure:
+            yield
+        self.functions.setdefault(name, {})[step] = tuple(measure)
+
+    @contextmanager
+    def _measure(self):
+        ''' Yields a list, filled with the wall, CPU and peak at the end '''
+        tracing = tracemalloc.is_tracing()
+        start = 0
+        if tracing:
+            start, peak = tracemalloc.get_traced_memory()
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            self._peaks.append(start)
+            tracemalloc.reset_peak()
+        measure = []
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield measure
+        finally:
+            measure.append(time.perf_counter() - wall)
+            measure.append(time.process_time() - cpu)
+            peak = None
+            if tracing:
+                _, peak = tracemalloc.get_traced_memory()
+                peak = max(self._peaks.pop(), peak)
+                tracemalloc.reset_peak()
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+                peak -= start
+            measure.append(peak)
+
+    def add_peaks(self, traced):
+        '''
+        Takes the peaks of the phases and functions measured in `traced`,
+        from a traced compilation of the same file.
+        '''
+        peaks = {phase[0]: phase[3] for phase in traced.phases}
+        self.phases = [(name, wall, cpu, peaks.get(name))
+                       for name, wall, cpu, _ in self.phases]
+        for name, steps in self.functions.items():
+            others = traced.functions.get(name, {})
+            for step, (wall, cpu, _) in steps.items():
+                peak = others.get(step, (None, None, None))[2]
+                steps[step] = (wall, cpu, peak)
+
+    def as_dict(self):
+        ''' Returns the measures as a dict of JSON types '''
+        def measure(wall, cpu, peak):
+            return {'wall': wall, 'cpu': cpu, 'peak': peak}
+
+        return {
+            'phases': [dict(name=name, **measure(*values))
+                       for name, *values in self.phases],
+            'functions': {
+                name: {step: measure(*values) for step, values in
+                       steps.items()}
+                for name, steps in self.functions.items()
+            },
+            'nodes': self.nodes,
+            'instructions': self.instructions,
+        }
+
+
+def timed(phases, name, step):
+    ''' Measures the step of the function if phases is given '''
+    if phases is None:
+        return nullcontext()
+    return phases.function(name, step)
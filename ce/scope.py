@@ -2,24 +2,44 @@ from contextlib import contextmanager
 
 
 class Scopes(object):
-    def __init__(self):
+    '''
+    Stack of scopes.
+
+    Besides the dict of each scope, keeps the stack of values bound to each
+    name, innermost last, so `get` does not depend on the nesting depth.
+    Emptied stacks are kept, to be reused by the next scope binding the name.
+    The dict of a scope is the undo log used to unbind its names when it is
+    popped. Values must be set with `scopes[name] = value`, not through
+    `current`.
+
+    `checks` tells the nodes validated in the scopes to check the bounds of
+    array accesses.
+    '''
+
+    def __init__(self, checks=False):
         super(Scopes, self).__init__()
         self.scopes = [{}]
+        self.names = {}
+        self.checks = checks
 
     def create(self):
         self.scopes.append({})
 
     def pop(self):
-        return self.scopes.pop()
+        scope = self.scopes.pop()
+        names = self.names
+        for name in scope:
+            names[name].pop()
+        return scope
 
     @property
     def current(self):
         return self.scopes[-1]
 
     def get(self, name):
-        for s in reversed(self.scopes):
-            if name in s:
-                return s[name]
+        stack = self.names.get(name)
+        if stack:
+            return stack[-1]
         return None
 
     def __contains__(self, item):
@@ -29,7 +49,15 @@ class Scopes(object):
         return self.current[key]
 
     def __setitem__(self, key, value):
-        self.current[key] = value
+        current = self.scopes[-1]
+        stack = self.names.get(key)
+        if stack is None:
+            self.names[key] = [value]
+        elif key in current:
+            stack[-1] = value
+        else:
+            stack.append(value)
+        current[key] = value
 
     @contextmanager
     def __call__(self):
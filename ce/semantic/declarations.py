@@ -1,18 +1,25 @@
-from functools import reduce
-
 from llvmlite import ir
 
+from ce.ctfe import NotConstant
 from ce.semantic.node import Node
-from ce.types import cast_numeric, cast_code
+from ce.semantic.values import Literal
+from ce.types import cast_numeric, cast_code, cast_value, INT_TYPES
 
 
 class DeclVariable(Node):
-    def __init__(self, typ, name, expr=None, dims=[]):
+    __slots__ = ('name', 'expr', 'dims', 'ptr', 'assigns', 'sizes', 'strides',
+                 'range')
+
+    def __init__(self, typ, name, expr=None, dims=()):
         super(DeclVariable, self).__init__()
         self.type = typ
         self.name = name
         self.expr = expr
         self.dims = dims
+        # Assignments to the variable, counted by `Assign.validate`
+        self.assigns = 0
+        # [start, stop) of loop counters while generating the loop body
+        self.range = None
 
     def validate(self, scope):
         if self.name in scope.current:
@@ -21,23 +28,72 @@ class DeclVariable(Node):
         # Add itself to scope
         scope[self.name] = self
 
+        for dim in self.dims:
+            dim.validate(scope)
+            if dim.type not in INT_TYPES:
+                raise TypeError('Array dimensions must be integers')
+
         if self.expr is None:
             return
         self.expr.validate(scope)
         cast_numeric(self.expr.type, self.type)
 
-    def generate(self, builder, scope):
-        size = reduce(lambda x, y: x * y.value, self.dims, 1)
-        ptr = builder.alloca(self.type.value, size, self.name)
-
-        # Adds itself to scope
-        scope[self.name] = ptr
+    def fold(self, evaluator=None):
+        self.dims = [dim.fold(evaluator) for dim in self.dims]
+        if self.expr is None:
+            return self
+        self.expr = self.expr.fold(evaluator)
+        if isinstance(self.expr, Literal):
+            self.expr = self.expr.cast(self.type) or self.expr
+        return self
+
+    def evaluate(self, evaluator):
+        if self.dims:
+            raise NotConstant(self.name)
+        evaluator.declare(self)
+        if self.expr is None:
+            return
+        value = self.expr.evaluate(evaluator)
+        evaluator[self] = cast_value(self.type, self.expr.type, value)
+
+    def storage(self):
+        '''
+        LLVM type of the storage of the variable.
+
+        Arrays are stored as one contiguous array, in row-major order. Sets
+        the `sizes` of their dimensions and the constant `strides` of each
+        index.
+        '''
+        if not self.dims:
+            return self.type.value
+        sizes = []
+        for dim in self.dims:
+            if not isinstance(dim, Literal) or dim.value <= 0:
+                error = 'Array "%s" dimensions must be positive constants'
+                raise Exception(error % self.name)
+            sizes.append(dim.value)
+        strides = [1]
+        for size in reversed(sizes[1:]):
+            strides.insert(0, strides[0] * size)
+        self.sizes = sizes
+        self.strides = strides
+        return ir.ArrayType(self.type.value, sizes[0] * strides[0])
+
+    def generate(self, builder):
+        typ = self.storage()
+        # Allocates in the entry block, so loops do not grow the stack and
+        # the variable can be promoted to a register
+        with builder.goto_entry_block():
+            ptr = builder.alloca(typ, 1, self.name)
+
+        # References to the variable are resolved to this node
+        self.ptr = ptr
 
         if self.expr is None:
             return ptr
 
         # Proper conversions and casting
-        expr = self.expr.generate(builder, scope)
+        expr = self.expr.generate(builder)
         convertion = cast_code(builder, self.type, self.expr.type)
         expr = convertion(expr)
         builder.store(expr, ptr)
@@ -45,51 +101,93 @@ class DeclVariable(Node):
 
 
 class DeclFunction(Node):
-    def __init__(self, typ, name, block, args=[]):
+    '''
+    Function, or its prototype if `block` is None. Prototypes declare
+    functions defined later or in other files.
+    '''
+    __slots__ = ('name', 'args', 'block', 'function', 'body', 'tail_loops')
+
+    def __init__(self, typ, name, block, args=()):
         super(DeclFunction, self).__init__()
         self.type = typ
         self.name = name
         self.args = args
         self.block = block
+        # Whether self tail calls jump back to the body instead
+        self.tail_loops = False
 
     def validate(self, scope):
         if self.name in scope.current:
-            raise Exception('Function %s already declared' % self.name)
+            self._redeclare(scope[self.name])
 
-        # Adds itself
-        scope[self.name] = self
+        # Adds itself. Calls after the definition are resolved to it
+        if self.block is not None or self.name not in scope.current:
+            scope[self.name] = self
 
         # Validate function block and args
         with scope() as scop:
             for arg in self.args:
+                if arg.dims:
+                    error = 'Array parameters are not supported (%s)'
+                    raise TypeError(error % arg.name)
                 arg.validate(scop)
-            self.block.validate(scop)
+            if self.block is not None:
+                self.block.validate(scop)
 
-    def generate(self, module, scope):
-        self.function = self._create_function(module)
+    def _redeclare(self, other):
+        ''' Checks the function may be declared again '''
+        if not isinstance(other, DeclFunction) or \
+                self.block is not None and other.block is not None:
+            raise Exception('Function %s already declared' % self.name)
+        if self.signature() != other.signature():
+            error = 'Function "%s" does not match its declaration'
+            raise TypeError(error % self.name)
 
-        # Adds itself to scope
-        scope[self.name] = self
+    def signature(self):
+        ''' Return and parameter types '''
+        return self.type, [arg.type for arg in self.args]
+
+    def fold(self, evaluator=None):
+        if self.block is not None:
+            self.block = self.block.fold(evaluator)
+        return self
+
+    def generate(self, module):
+        if self.block is None:
+            return self.declare(module)
+
+        # Calls are resolved to this node. Declared functions are moved to
+        # their definition, as linking the declaration with it does
+        self.function = self.declare(module)
+        module.globals.move_to_end(self.name)
 
         # Append block
         block = self.function.append_basic_block(self.name)
         builder = ir.IRBuilder(block)
 
-        with scope() as scop:
-            # allocate parameters
-            self._allocate_args(builder, scop)
-
-            # generate body
-            block = builder.append_basic_block('body')
-            builder.branch(block)
-            with builder.goto_block(block):
-                self.block.generate(builder, scop)
+        # allocate parameters
+        self._allocate_args(builder)
+
+        # generate body
+        block = builder.append_basic_block('body')
+        self.body = block
+        builder.branch(block)
+        with builder.goto_block(block):
+            self.block.generate(builder)
         return builder
 
-    def _allocate_args(self, builder, scope):
+    def declare(self, module):
+        ''' Declares the function, unless already in the module '''
+        # Calls are resolved to this node
+        self.function = module.globals.get(self.name)
+        if self.function is None:
+            self.function = self._create_function(module)
+        return self.function
+
+    def _allocate_args(self, builder):
         ''' Allocates the passed args of the function to the function body. '''
         for arg, par in zip(self.args, self.function.args):
-            ptr = arg.generate(builder, scope)
+            ptr = arg.generate(builder)
             builder.store(par, ptr)
 
     def _create_function(self, module):
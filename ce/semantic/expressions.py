@@ -1,9 +1,13 @@
+from ce.ctfe import NotConstant
 from ce.semantic.node import Node
-from ce.types import Types, cast_code, cast_numeric, get_operation, \
-    NUMERIC_TYPES, BOOLEAN_OPS
+from ce.semantic.values import Literal
+from ce.types import Types, cast_code, cast_numeric, cast_value, \
+    get_operation, fold_operation, NUMERIC_TYPES, BOOLEAN_OPS
 
 
 class OpBin(Node):
+    __slots__ = ('left', 'op', 'right')
+
     def __init__(self, left, op, right):
         super(OpBin, self).__init__()
         self.left = left
@@ -20,9 +24,9 @@ class OpBin(Node):
         else:
             self.type = cast_numeric(self.left.type, self.right.type)
 
-    def generate(self, builder, scope):
-        left = self.left.generate(builder, scope)
-        right = self.right.generate(builder, scope)
+    def generate(self, builder):
+        left = self.left.generate(builder)
+        right = self.right.generate(builder)
 
         # cast to values
         typ = cast_numeric(self.left.type, self.right.type)
@@ -34,6 +38,37 @@ class OpBin(Node):
         operation = get_operation(builder, self.op, self.type)
         return operation(left, right)
 
+    def fold(self, evaluator=None):
+        self.left = self.left.fold(evaluator)
+        self.right = self.right.fold(evaluator)
+        if not isinstance(self.left, Literal) or \
+                not isinstance(self.right, Literal):
+            return self
+        value = self._operate(self.left.value, self.right.value)
+        if value is None:
+            return self
+        return Literal(value, self.type)
+
+    def evaluate(self, evaluator):
+        left = self.left.evaluate(evaluator)
+        right = self.right.evaluate(evaluator)
+        value = self._operate(left, right)
+        if value is None:
+            raise NotConstant(self.op)
+        return value
+
+    def _operate(self, left, right):
+        ''' Value of the operation over constants, None if at run time '''
+        typ = cast_numeric(self.left.type, self.right.type)
+        if typ not in NUMERIC_TYPES:
+            return None
+        try:
+            left = cast_value(typ, self.left.type, left)
+            right = cast_value(typ, self.right.type, right)
+            return fold_operation(self.op, typ, left, right)
+        except (ArithmeticError, ValueError):
+            return None
+
     def _boolean(self):
         left = self.left.type
         right = self.right.type
@@ -43,6 +78,8 @@ class OpBin(Node):
 
 
 class OpUn(Node):
+    __slots__ = ('operation', 'right')
+
     def __init__(self, operation, right):
         super(OpUn, self).__init__()
         self.operation = operation
@@ -54,7 +91,30 @@ class OpUn(Node):
             raise Exception('Unary operation must be with numbers')
         self.type = self.right.type
 
-    def generate(self, builder, scope):
+    def fold(self, evaluator=None):
+        self.right = self.right.fold(evaluator)
+        if not isinstance(self.right, Literal):
+            return self
+        value = self._operate(self.right.value)
+        if value is None:
+            return self
+        return Literal(value, self.type)
+
+    def evaluate(self, evaluator):
+        value = self._operate(self.right.evaluate(evaluator))
+        if value is None:
+            raise NotConstant(self.operation)
+        return value
+
+    def _operate(self, right):
+        ''' Value of the operation over a constant, None if at run time '''
+        zero = cast_value(self.type, Types.INT, 0)
+        try:
+            return fold_operation(self.operation, self.type, zero, right)
+        except (ArithmeticError, ValueError):
+            return None
+
+    def generate(self, builder):
         zero = self.right.type.value(0)
-        right = self.right.generate(builder, scope)
+        right = self.right.generate(builder)
         return builder.sub(zero, right)
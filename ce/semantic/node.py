@@ -1,18 +1,50 @@
+import sys
 from abc import ABC, abstractmethod
 
+from ce.ctfe import NotConstant
+
 
 class Node(ABC):
     ''' Base class for the nodes of the parse tree. '''
-    _type = None
+    __slots__ = ('_type',)
+
+    def __init__(self):
+        super(Node, self).__init__()
+        self._type = None
 
     @abstractmethod
     def validate(self, scope):
         pass
 
     @abstractmethod
-    def generate(self, builder, scope):
+    def generate(self, builder):
         pass
 
+    def fold(self, evaluator=None):
+        '''
+        Folds the constant expressions of the validated node.
+
+        Args:
+            evaluator: Optional `ce.ctfe.Evaluator`, to evaluate the calls
+                with literal args.
+
+        Returns:
+            The node to use in place of this one.
+        '''
+        return self
+
+    def evaluate(self, evaluator):
+        '''
+        Evaluates the validated node at compile time.
+
+        Returns:
+            The value of expressions.
+
+        Raises:
+            NotConstant when it can not be evaluated.
+        '''
+        raise NotConstant(type(self).__name__)
+
     @property
     def type(self):
         return self._type
@@ -20,3 +52,67 @@ class Node(ABC):
     @type.setter
     def type(self, typ):
         self._type = typ
+
+    def fields(self):
+        ''' Yields the (name, value) of each attribute that is set '''
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if hasattr(self, name):
+                    yield name, getattr(self, name)
+
+    def children(self):
+        ''' Yields the nodes directly below this one '''
+        for _, value in self.fields():
+            if isinstance(value, Node):
+                yield value
+            elif isinstance(value, (list, tuple)):
+                for item in value:
+                    if isinstance(item, Node):
+                        yield item
+
+
+def walk(tree):
+    ''' Yields every node of the tree, parents first '''
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        yield node
+        children = list(node.children())
+        stack.extend(reversed(children))
+
+
+# Values held by nodes that belong to the tree
+LEAVES = (str, bytes, int, float, list, tuple)
+
+
+def memory_report(tree):
+    '''
+    Memory used by a tree.
+
+    Counts the nodes, the lists holding them and the names and literal values
+    they reference. Objects shared between nodes are counted once. Types and
+    generated LLVM objects are not counted.
+
+    Args:
+        tree: Root node.
+
+    Returns:
+        A dict with the number of `nodes`, the total `bytes` and, in
+        `classes`, the [count, bytes] of each node class.
+    '''
+    seen = set()
+    classes = {}
+    for node in walk(tree):
+        size = sys.getsizeof(node)
+        for _, value in node.fields():
+            if isinstance(value, LEAVES) and id(value) not in seen:
+                seen.add(id(value))
+                size += sys.getsizeof(value)
+        stats = classes.setdefault(type(node).__name__, [0, 0])
+        stats[0] += 1
+        stats[1] += size
+    return {
+        'nodes': sum(count for count, _ in classes.values()),
+        'bytes': sum(size for _, size in classes.values()),
+        'classes': classes,
+    }
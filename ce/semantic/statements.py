@@ -1,43 +1,93 @@
+import re
+
 from llvmlite import ir
 
+from ce.ctfe import Returned, constant
+from ce.phases import timed
 from ce.scope import Scopes
 from ce.semantic.node import Node
-from ce.types import Types, cast_code
+from ce.types import Types, OpTypes, cast_code, cast_value, INT_TYPES
+from ce.semantic.values import Var, Literal, Call
+from ce.semantic.expressions import OpBin
 from ce.semantic.declarations import DeclVariable, DeclFunction
 
 
 class Main(Node):
-    def __init__(self, commands=[]):
+    __slots__ = ('commands', 'module')
+
+    def __init__(self, commands=()):
         super(Main, self).__init__()
         self.commands = commands
         self.module = ir.Module()
 
-    def validate(self):
-        scope = Scopes()
+    def validate(self, checks=False, phases=None):
+        '''
+        Validates the program.
+
+        Args:
+            checks: Checks the bounds of array accesses at run time.
+            phases: Optional `ce.phases.Phases`, measuring each function.
+        '''
+        scope = Scopes(checks)
         with scope() as scop:
             for c in self.commands:
-                c.validate(scop)
-
-    def generate(self):
-        scope = Scopes()
+                with _timed(phases, c, 'validate'):
+                    c.validate(scop)
+
+    def fold(self, evaluator=None, phases=None):
+        commands = []
+        for c in self.commands:
+            with _timed(phases, c, 'fold'):
+                commands.append(c.fold(evaluator))
+        self.commands = commands
+        return self
+
+    def generate(self, tail_loops=False, phases=None):
+        '''
+        Generates the module.
+
+        Args:
+            tail_loops: Rewrites the self tail calls of the functions into
+                loops.
+            phases: As in `validate`.
+        '''
+        self._prototypes(self.module)
         for comm in self.commands:
             if isinstance(comm, DeclVariable):
-                ptr = self._var(comm)
-                scope[comm.name] = ptr
+                self._var(comm, self.module)
             if isinstance(comm, DeclFunction):
-                comm.generate(self.module, scope)
+                comm.tail_loops = tail_loops
+                with _timed(phases, comm, 'generate'):
+                    comm.generate(self.module)
         return self.module
 
-    def _var(self, comm):
-        var = ir.GlobalVariable(self.module, comm.type.value, comm.name)
+    def _prototypes(self, module):
+        '''
+        Declares the functions of the prototypes first, as linking the files
+        (see `ce.compiler.link_files`) drops the declarations no file uses,
+        and would move the others to their uses.
+        '''
+        for comm in self.commands:
+            if isinstance(comm, DeclFunction) and comm.block is None:
+                comm.declare(module)
+
+    def _var(self, comm, module):
+        typ = comm.storage()
+        var = ir.GlobalVariable(module, typ, comm.name)
+        # References to the variable are resolved to its declaration
+        comm.ptr = var
         if comm.expr is None:
-            return
-        var.initializer = comm.expr.generate(None, None)
+            # Zero initialized, as in C
+            var.initializer = typ(None)
+            return var
+        var.initializer = comm.expr.generate(None)
         return var
 
 
 class Block(Node):
-    def __init__(self, commands=[]):
+    __slots__ = ('commands',)
+
+    def __init__(self, commands=()):
         super(Block, self).__init__()
         self.commands = commands
 
@@ -45,16 +95,35 @@ class Block(Node):
         for command in self.commands:
             command.validate(scope)
 
-    def generate(self, builder, scope):
-        return [c.generate(builder, scope) for c in self.commands]
+    def fold(self, evaluator=None):
+        self.commands = [c.fold(evaluator) for c in self.commands]
+        return self
+
+    def evaluate(self, evaluator):
+        for command in self.commands:
+            evaluator.step()
+            command.evaluate(evaluator)
+
+    def generate(self, builder):
+        return [c.generate(builder) for c in self.commands]
+
+
+def _timed(phases, command, step):
+    ''' Measures the step of the command if it defines a function '''
+    if not isinstance(command, DeclFunction) or command.block is None:
+        phases = None
+    return timed(phases, getattr(command, 'name', None), step)
 
 
 class If(Node):
-    def __init__(self, expr, block, else_block=Block()):
+    __slots__ = ('expr', 'block', 'else_block')
+
+    def __init__(self, expr, block, else_block=None):
         super(If, self).__init__()
         self.expr = expr
         self.block = block
-        self.else_block = else_block
+        # A block of its own, as folding replaces its commands
+        self.else_block = Block() if else_block is None else else_block
 
     def validate(self, scope):
         self.expr.validate(scope)
@@ -68,64 +137,259 @@ class If(Node):
         with scope() as scop:
             self.else_block.validate(scope)
 
-    def generate(self, builder, scope):
-        expr = self.expr.generate(builder, scope)
+    def fold(self, evaluator=None):
+        self.expr = self.expr.fold(evaluator)
+        self.block = self.block.fold(evaluator)
+        self.else_block = self.else_block.fold(evaluator)
+        return self
+
+    def evaluate(self, evaluator):
+        if self.expr.evaluate(evaluator):
+            self.block.evaluate(evaluator)
+        else:
+            self.else_block.evaluate(evaluator)
+
+    def generate(self, builder):
+        expr = self.expr.generate(builder)
         with builder.if_else(expr) as (then, other):
             # if
             with then:
-                with scope() as scop:
-                    self.block.generate(builder, scop)
+                self.block.generate(builder)
             # else
             with other:
-                with scope() as scop:
-                    self.else_block.generate(builder, scop)
+                self.else_block.generate(builder)
         return builder.block
 
 
+# Headers of the loops generated by For and While
+LOOP_HEADER = re.compile(r'(for-if|while)(\.\d+)?$')
+
+# Property of loop metadata naming the loop in the source
+LOOP_NAME = 'ce.loop'
+
+
+class _Distinct(ir.MDValue):
+    ''' Metadata node that is not uniqued, such as loop IDs '''
+
+    def descr(self, buf):
+        buf.append('distinct ')
+        super(_Distinct, self).descr(buf)
+
+    def __eq__(self, other):
+        return self is other
+
+    def __hash__(self):
+        return id(self)
+
+
+def _distinct(module):
+    ''' New distinct metadata node, without operands '''
+    return _Distinct(module, [], name=str(len(module.metadata)))
+
+
+def _loop(builder, header, back, hints):
+    '''
+    Sets the llvm.loop metadata on the back edge of the loop: the name of the
+    loop, as `<function>: <para|enquanto> <n>`, and the properties of its
+    hints.
+
+    Args:
+        builder: IRBuilder, after the loop.
+        header: First block of the loop.
+        back: Branch to the header.
+        hints: `Hint`s of the loop.
+    '''
+    function = builder.function
+    module = builder.module
+    blocks = function.blocks
+    headers = [b for b in blocks[1:] if LOOP_HEADER.match(b.name)]
+    kind = 'para' if header.name.startswith('for') else 'enquanto'
+    name = '%s: %s %d' % (function.name, kind, headers.index(header) + 1)
+
+    properties = [module.add_metadata([LOOP_NAME, name])]
+    for hint in hints:
+        properties.extend(hint.generate(module))
+    if any(hint.name == 'independente' for hint in hints):
+        # Marks the memory accesses of the loop as free of dependences
+        # between iterations
+        group = _distinct(module)
+        for block in blocks[blocks.index(header):]:
+            for instruction in block.instructions:
+                if isinstance(instruction, (ir.LoadInstr, ir.StoreInstr)):
+                    _access_group(module, instruction, group)
+        parallel = ['llvm.loop.parallel_accesses', group]
+        properties.append(module.add_metadata(parallel))
+
+    loop = _distinct(module)
+    loop.operands = (loop, *properties)
+    back.set_metadata('llvm.loop', loop)
+
+
+def _access_group(module, instruction, group):
+    ''' Adds the instruction to the access group, keeping its other groups '''
+    groups = instruction.metadata.get('llvm.access.group')
+    if groups is None:
+        groups = group
+    elif isinstance(groups, _Distinct):
+        groups = module.add_metadata([groups, group])
+    else:
+        groups = module.add_metadata([*groups.operands, group])
+    instruction.set_metadata('llvm.access.group', groups)
+
+
+class Hint(Node):
+    '''
+    Optimization hint of a loop, written before `para` and `enquanto`:
+        - `@desenrola(n)` unrolls the loop n times. Without n, lets LLVM
+          pick the count, and `@desenrola(1)` disables unrolling.
+        - `@vetoriza(n)` vectorizes the loop with n lanes. Without n, lets
+          LLVM pick the width, and `@vetoriza(1)` disables vectorization.
+        - `@independente` asserts that no iteration reads or writes memory
+          written by another one, so the loop can be vectorized without
+          checking for aliasing.
+    '''
+    __slots__ = ('name', 'value')
+
+    NAMES = ('desenrola', 'vetoriza', 'independente')
+
+    def __init__(self, name, value=None):
+        super(Hint, self).__init__()
+        self.name = name
+        self.value = value
+
+    def validate(self, scope):
+        if self.name not in self.NAMES:
+            raise SyntaxError('Unknown loop hint "@%s"' % self.name)
+        if self.name == 'independente' and self.value is not None:
+            raise SyntaxError('Loop hint "@independente" takes no value')
+        if self.value is not None and self.value < 1:
+            raise SyntaxError('Loop hint "@%s" must be positive' % self.name)
+
+    def generate(self, module):
+        ''' Properties of the llvm.loop metadata '''
+        i32 = ir.IntType(32)
+        i1 = ir.IntType(1)
+        if self.name == 'desenrola':
+            if self.value is None:
+                return [module.add_metadata(['llvm.loop.unroll.enable'])]
+            if self.value == 1:
+                return [module.add_metadata(['llvm.loop.unroll.disable'])]
+            count = ['llvm.loop.unroll.count', i32(self.value)]
+            return [module.add_metadata(count)]
+        if self.name == 'vetoriza':
+            enable = ['llvm.loop.vectorize.enable', i1(self.value != 1)]
+            properties = [module.add_metadata(enable)]
+            if self.value is not None and self.value > 1:
+                width = ['llvm.loop.vectorize.width', i32(self.value)]
+                properties.append(module.add_metadata(width))
+            return properties
+        return []
+
+
 class For(Node):
-    def __init__(self, decl, cond, step, block):
+    __slots__ = ('decl', 'cond', 'step', 'block', 'hints')
+
+    def __init__(self, decl, cond, step, block, hints=()):
         super(For, self).__init__()
         self.decl = decl
         self.cond = cond
         self.step = step
         self.block = block
+        self.hints = hints
 
     def validate(self, scope):
+        for hint in self.hints:
+            hint.validate(scope)
         with scope() as scop:
             self.decl.validate(scop)
             cond = If(self.cond, self.block)
             cond.validate(scop)
             self.step.validate(scop)
 
-    def generate(self, builder, scope):
-        with scope() as scop:
-            # declaration
-            block = builder.append_basic_block('for-decl')
-            builder.branch(block)
-            builder.position_at_start(block)
-            self.decl.generate(builder, scop)
-
-            # condition
-            block = builder.append_basic_block('for-if')
-            builder.branch(block)
-            builder.position_at_start(block)
-            cond = self.cond.generate(builder, scop)
-
-            # body
-            with builder.if_then(cond):
-                self.block.generate(builder, scop)
-                self.step.generate(builder, scop)
-                builder.branch(block)
+    def fold(self, evaluator=None):
+        self.decl = self.decl.fold(evaluator)
+        self.cond = self.cond.fold(evaluator)
+        self.step = self.step.fold(evaluator)
+        self.block = self.block.fold(evaluator)
+        return self
+
+    def evaluate(self, evaluator):
+        self.decl.evaluate(evaluator)
+        while self.cond.evaluate(evaluator):
+            evaluator.step()
+            self.block.evaluate(evaluator)
+            self.step.evaluate(evaluator)
+
+    def generate(self, builder):
+        # declaration
+        block = builder.append_basic_block('for-decl')
+        builder.branch(block)
+        builder.position_at_start(block)
+        self.decl.generate(builder)
+
+        # condition
+        block = builder.append_basic_block('for-if')
+        builder.branch(block)
+        builder.position_at_start(block)
+        cond = self.cond.generate(builder)
+
+        # body. The counter is within its range until the step is done
+        self.decl.range = self._range()
+        with builder.if_then(cond):
+            self.block.generate(builder)
+            self.step.generate(builder)
+            back = builder.branch(block)
+        self.decl.range = None
+        _loop(builder, block, back, self.hints)
         return builder.block
 
+    def _range(self):
+        '''
+        Range [start, stop) of the counter of loops such as
+        `para (medio i = 0; i < 10; i = i + 1)`, which only the step assigns.
+        None for other loops.
+        '''
+        decl, cond, step = self.decl, self.cond, self.step.expr
+        if decl.type not in INT_TYPES or decl.assigns != 1 or \
+                not isinstance(decl.expr, Literal):
+            return None
+        if not isinstance(cond, OpBin) or \
+                cond.op not in (OpTypes.LT, OpTypes.LE) or \
+                not _counter(cond.left, decl) or \
+                not isinstance(cond.right, Literal) or \
+                cond.right.type not in INT_TYPES:
+            return None
+        if not _counter(self.step.var, decl):
+            return None
+        if not isinstance(step, OpBin) or step.op != OpTypes.ADD or \
+                not _counter(step.left, decl) or \
+                not isinstance(step.right, Literal) or \
+                step.right.type not in INT_TYPES or step.right.value <= 0:
+            return None
+        stop = cond.right.value + (cond.op == OpTypes.LE)
+        # The step must not wrap around
+        if stop - 1 + step.right.value >= 1 << (decl.type.value.width - 1):
+            return None
+        return (decl.expr.value, stop)
+
+
+def _counter(node, decl):
+    ''' Whether the node reads the variable `decl` '''
+    return isinstance(node, Var) and not node.dims and node.decl is decl
+
 
 class While(Node):
-    def __init__(self, cond, block):
+    __slots__ = ('cond', 'block', 'hints')
+
+    def __init__(self, cond, block, hints=()):
         super(While, self).__init__()
         self.cond = cond
         self.block = block
+        self.hints = hints
 
     def validate(self, scope):
+        for hint in self.hints:
+            hint.validate(scope)
         self.cond.validate(scope)
         if self.cond.type != Types.BOOLEAN:
             error = self.cond.type
@@ -133,59 +397,175 @@ class While(Node):
         with scope() as scop:
             self.block.validate(scop)
 
-    def generate(self, builder, scope):
+    def fold(self, evaluator=None):
+        self.cond = self.cond.fold(evaluator)
+        self.block = self.block.fold(evaluator)
+        return self
+
+    def evaluate(self, evaluator):
+        while self.cond.evaluate(evaluator):
+            evaluator.step()
+            self.block.evaluate(evaluator)
+
+    def generate(self, builder):
         block = builder.append_basic_block('while')
         builder.branch(block)
         builder.position_at_start(block)
-        with scope() as scop:
-            # condition
-            cond = self.cond.generate(builder, scope)
-            # body
-            with builder.if_then(cond):
-                self.block.generate(builder, scop)
-                builder.branch(block)
-            block = builder.block
-        return block
+        # condition
+        cond = self.cond.generate(builder)
+        # body
+        with builder.if_then(cond):
+            self.block.generate(builder)
+            back = builder.branch(block)
+        _loop(builder, block, back, self.hints)
+        return builder.block
+
+
+# Switches with at least this many cases, covering at least this fraction
+# of the range of their labels, are lowered to a jump table
+JUMP_TABLE_CASES = 4
+JUMP_TABLE_DENSITY = 0.4
+
+# Cases compared one by one at the leaves of the binary search
+LINEAR_CASES = 3
 
 
 class Switch(Node):
-    def __init__(self, expr, cases=[]):
+    '''
+    `caso`, with its `seja` cases and an optional `senao` default block.
+    Without a default, nothing runs when no case matches.
+
+    The values of the labels, in the type of the expression, are kept in
+    `labels` by `validate`.
+    '''
+    __slots__ = ('expr', 'cases', 'default', 'labels')
+
+    def __init__(self, expr, cases=(), default=None):
         super(Switch, self).__init__()
         self.expr = expr
         self.cases = cases
+        self.default = default
+        self.labels = []
 
     def validate(self, scope):
         self.expr.validate(scope)
+        if self.expr.type not in INT_TYPES:
+            error = self.expr.type.name
+            raise TypeError('Switch expression must be an integer. Got %s' %
+                            error)
 
         if len(self.cases) == 0:
             raise SyntaxError('There must be at least one case')
 
         for block in self.cases:
             block.validate(scope)
-
-    def generate(self, builder, scope):
-        with scope() as scop:
-            block = builder.append_basic_block('switch')
-            builder.branch(block)
-            builder.position_at_start(block)
-            expr = self.expr.generate(builder, scope)
-
-            # creates blocks
-            blocks = [builder.append_basic_block('case') for _ in self.cases]
-            exit = builder.append_basic_block('switch-exit')
-            default = blocks[0]
-            switch = builder.switch(expr, default)
-            for block, case in zip(blocks, self.cases):
-                expr = case.expr.generate(builder, scop)
-                with builder.goto_block(block):
-                    case.block.generate(builder, scop)
+        self.labels = self._labels()
+        if self.default is not None:
+            with scope() as scop:
+                self.default.validate(scop)
+
+    def fold(self, evaluator=None):
+        self.expr = self.expr.fold(evaluator)
+        self.cases = [case.fold(evaluator) for case in self.cases]
+        if self.default is not None:
+            self.default = self.default.fold(evaluator)
+        return self
+
+    def evaluate(self, evaluator):
+        value = self.expr.evaluate(evaluator)
+        for label, case in zip(self.labels, self.cases):
+            if label == value:
+                case.block.evaluate(evaluator)
+                return
+        if self.default is not None:
+            self.default.evaluate(evaluator)
+
+    def generate(self, builder):
+        labels = self.labels
+        block = builder.append_basic_block('switch')
+        builder.branch(block)
+        builder.position_at_start(block)
+        expr = self.expr.generate(builder)
+
+        # creates blocks
+        blocks = [builder.append_basic_block('case') for _ in self.cases]
+        if self.default is not None:
+            default = builder.append_basic_block('switch-default')
+        exit = builder.append_basic_block('switch-exit')
+        otherwise = exit if self.default is None else default
+
+        cases = sorted(zip(labels, blocks), key=lambda case: case[0])
+        span = cases[-1][0] - cases[0][0] + 1
+        if len(cases) >= JUMP_TABLE_CASES and \
+                len(cases) >= span * JUMP_TABLE_DENSITY:
+            switch = builder.switch(expr, otherwise)
+            for label, block in cases:
+                switch.add_case(expr.type(label), block)
+        else:
+            _search(builder, expr, cases, otherwise)
+
+        bodies = list(zip(blocks, (case.block for case in self.cases)))
+        if self.default is not None:
+            bodies.append((default, self.default))
+        for block, body in bodies:
+            with builder.goto_block(block):
+                body.generate(builder)
+                if not builder.block.is_terminated:
                     builder.branch(exit)
-                switch.add_case(expr, block)
-            builder.position_at_start(exit)
-            return exit
+        builder.position_at_start(exit)
+        return exit
+
+    def _labels(self):
+        '''
+        Values of the labels of the cases, in the type of the expression.
+
+        Raises:
+            TypeError when a label is not an integer constant.
+            ValueError when labels are repeated.
+        '''
+        labels = []
+        for case in self.cases:
+            # Evaluated even if the tree is not folded
+            value = constant(case.expr)
+            if value is None or case.expr.type not in INT_TYPES:
+                raise TypeError('Case labels must be integer constants')
+            value = cast_value(self.expr.type, case.expr.type, value)
+            if value in labels:
+                raise ValueError('Repeated case label %d' % value)
+            labels.append(value)
+        return labels
+
+
+def _search(builder, expr, cases, otherwise):
+    '''
+    Binary search for the value of expr over the cases, sorted (label, block)
+    pairs, branching to `otherwise` if there is no match.
+    '''
+    typ = expr.type
+    if len(cases) <= LINEAR_CASES:
+        for i, (label, block) in enumerate(cases):
+            match = builder.icmp_signed('==', expr, typ(label))
+            if i == len(cases) - 1:
+                builder.cbranch(match, block, otherwise)
+                return
+            other = builder.append_basic_block('switch-next')
+            builder.cbranch(match, block, other)
+            builder.position_at_start(other)
+
+    middle = len(cases) // 2
+    low = builder.append_basic_block('switch-low')
+    high = builder.append_basic_block('switch-high')
+    less = builder.icmp_signed('<', expr, typ(cases[middle][0]))
+    builder.cbranch(less, low, high)
+    builder.position_at_start(low)
+    _search(builder, expr, cases[:middle], otherwise)
+    builder.position_at_start(high)
+    _search(builder, expr, cases[middle:], otherwise)
 
 
 class Case(Node):
+    __slots__ = ('expr', 'block')
+
     def __init__(self, expr, block):
         super(Case, self).__init__()
         self.expr = expr
@@ -196,11 +576,18 @@ class Case(Node):
         with scope() as scop:
             self.block.validate(scop)
 
-    def generate(self, builder, scope):
+    def fold(self, evaluator=None):
+        self.expr = self.expr.fold(evaluator)
+        self.block = self.block.fold(evaluator)
+        return self
+
+    def generate(self, builder):
         pass
 
 
 class Return(Node):
+    __slots__ = ('expr',)
+
     def __init__(self, expr=None):
         super(Return, self).__init__()
         self.expr = expr
@@ -210,12 +597,50 @@ class Return(Node):
             return
         self.expr.validate(scope)
 
-    def generate(self, builder, scope):
+    def fold(self, evaluator=None):
+        if self.expr is not None:
+            self.expr = self.expr.fold(evaluator)
+        return self
+
+    def evaluate(self, evaluator):
+        if self.expr is None:
+            raise Returned(None, Types.VOID)
+        raise Returned(self.expr.evaluate(evaluator), self.expr.type)
+
+    def generate(self, builder):
         if self.expr is None:
             typ = builder.function.return_value.type
             return builder.ret(typ(None))
-        expr = self.expr.generate(builder, scope)
         typ = Types(builder.function.return_value.type)
+        if isinstance(self.expr, Call):
+            expr = self._tail_call(builder, typ)
+            if builder.block.is_terminated:
+                return expr
+        else:
+            expr = self.expr.generate(builder)
         conversion = cast_code(builder, typ, self.expr.type)
         expr = conversion(expr)
         return builder.ret(expr)
+
+    def _tail_call(self, builder, typ):
+        '''
+        Generates the call being returned. Self tail calls of functions with
+        `tail_loops` assign the args and jump back to the body. Other self
+        calls are guaranteed tail calls (musttail), and the rest are marked
+        as tail calls. Marking them musttail would break when the callee is
+        not inlined and tail recursion elimination adds an accumulator to
+        the returns of the caller.
+        '''
+        call = self.expr
+        function = call.function
+        if function.function is builder.function and function.tail_loops:
+            values = [
+                cast_code(builder, decl.type, arg.type)(arg.generate(builder))
+                for decl, arg in zip(function.args, call.args)
+            ]
+            for decl, value in zip(function.args, values):
+                builder.store(value, decl.ptr)
+            return builder.branch(function.body)
+
+        same = function.function is builder.function
+        return call.generate(builder, 'musttail' if same else 'tail')
@@ -1,9 +1,31 @@
+from llvmlite import ir
+
+from ce.ctfe import NotConstant
 from ce.semantic.node import Node
-from ce.types import cast_numeric, cast_code
+from ce.types import Types, cast_numeric, cast_code, cast_value, \
+    NUMERIC_TYPES, INT_TYPES
+
+
+# Type of the indexes of arrays
+INDEX = ir.IntType(64)
+
+
+def _trap(module):
+    ''' Declares llvm.trap, which aborts the program '''
+    trap = module.globals.get('llvm.trap')
+    if trap is None:
+        typ = ir.FunctionType(ir.VoidType(), [])
+        trap = ir.Function(module, typ, 'llvm.trap')
+    return trap
 
 
 class Var(Node):
-    def __init__(self, name, dims=[]):
+    '''
+    Variable, or element of an array if `dims` has the index expressions.
+    '''
+    __slots__ = ('name', 'dims', 'decl', 'checked')
+
+    def __init__(self, name, dims=()):
         super(Var, self).__init__()
         self.name = name
         self.dims = dims
@@ -12,16 +34,84 @@ class Var(Node):
         var = scope.get(self.name)
         if var is None:
             raise Exception('Variable "%s" not declared' % self.name)
-        if len(var.dims) < len(self.dims):
-            raise Exception('Trying to access bigger array dimensions')
+        if len(var.dims) != len(self.dims):
+            error = (self.name, len(var.dims), len(self.dims))
+            raise Exception('Array "%s" has %d dimensions, got %d' % error)
+        for index in self.dims:
+            index.validate(scope)
+            if index.type not in INT_TYPES:
+                raise TypeError('Array indexes must be integers')
         self.type = var.type
-
-    def generate(self, builder, scope):
-        ptr = scope.get(self.name)
-        return builder.load(ptr)
+        self.decl = var
+        self.checked = scope.checks
+
+    def fold(self, evaluator=None):
+        ''' Replaced by the value of constants: never assigned variables '''
+        self.dims = [index.fold(evaluator) for index in self.dims]
+        decl = self.decl
+        if decl.assigns or decl.dims or not isinstance(decl.expr, Literal):
+            return self
+        literal = decl.expr.cast(self.type)
+        return self if literal is None else literal
+
+    def evaluate(self, evaluator):
+        if self.dims:
+            raise NotConstant(self.name)
+        return evaluator[self.decl]
+
+    def generate(self, builder):
+        return builder.load(self.pointer(builder))
+
+    def pointer(self, builder):
+        ''' Address of the variable or of the element of the array '''
+        decl = self.decl
+        if not self.dims:
+            return decl.ptr
+        # Constant indexes are added up at compile time
+        offset = 0
+        index = None
+        for expr, size, stride in zip(self.dims, decl.sizes, decl.strides):
+            if isinstance(expr, Literal):
+                if not 0 <= expr.value < size:
+                    error = 'Index %d out of "%s" bounds (%d)'
+                    raise IndexError(error % (expr.value, self.name, size))
+                offset += expr.value * stride
+                continue
+            value = self._index(builder, expr, size)
+            if stride != 1:
+                value = builder.mul(value, INDEX(stride), flags=['nsw'])
+            if index is not None:
+                value = builder.add(index, value, flags=['nsw'])
+            index = value
+        if index is None:
+            index = INDEX(offset)
+        elif offset:
+            index = builder.add(index, INDEX(offset), flags=['nsw'])
+        return builder.gep(decl.ptr, [INDEX(0), index], inbounds=True)
+
+    def _index(self, builder, expr, size):
+        ''' Generates the index, checking its bounds if asked to '''
+        value = expr.generate(builder)
+        value = cast_code(builder, Types.LONG, expr.type)(value)
+        if not self.checked or self._in_range(expr, size):
+            return value
+        inside = builder.icmp_unsigned('<', value, INDEX(size))
+        with builder.if_then(builder.not_(inside), likely=False):
+            builder.call(_trap(builder.module), [])
+            builder.unreachable()
+        return value
+
+    def _in_range(self, expr, size):
+        ''' Whether the index is a loop counter always within the size '''
+        if not isinstance(expr, Var) or expr.dims:
+            return False
+        bounds = expr.decl.range
+        return bounds is not None and 0 <= bounds[0] and bounds[1] <= size
 
 
 class Assign(Node):
+    __slots__ = ('var', 'expr')
+
     def __init__(self, var, expr):
         super(Assign, self).__init__()
         self.var = var
@@ -31,17 +121,35 @@ class Assign(Node):
         self.var.validate(scope)
         self.expr.validate(scope)
         cast_numeric(self.var.type, self.expr.type)
-
-    def generate(self, builder, scope):
-        ptr = scope.get(self.var.name)
-        expr = self.expr.generate(builder, scope)
+        self.var.decl.assigns += 1
+
+    def fold(self, evaluator=None):
+        var = self.var
+        var.dims = [index.fold(evaluator) for index in var.dims]
+        self.expr = self.expr.fold(evaluator)
+        if isinstance(self.expr, Literal):
+            self.expr = self.expr.cast(self.var.type) or self.expr
+        return self
+
+    def evaluate(self, evaluator):
+        if self.var.dims:
+            raise NotConstant(self.var.name)
+        value = self.expr.evaluate(evaluator)
+        value = cast_value(self.var.type, self.expr.type, value)
+        evaluator[self.var.decl] = value
+
+    def generate(self, builder):
+        ptr = self.var.pointer(builder)
+        expr = self.expr.generate(builder)
         conversion = cast_code(builder, self.var.type, self.expr.type)
         expr = conversion(expr)
         return builder.store(expr, ptr)
 
 
 class Call(Node):
-    def __init__(self, name, args=[]):
+    __slots__ = ('name', 'args', 'function')
+
+    def __init__(self, name, args=()):
         super(Call, self).__init__()
         self.name = name
         self.args = args
@@ -54,10 +162,34 @@ class Call(Node):
         self.function = function
         self._check_args_list(scope)
 
-    def generate(self, builder, scope):
-        func = scope.get(self.name)
-        args = [a.generate(builder, scope) for a in self.args]
-        return builder.call(func.function, args)
+    def fold(self, evaluator=None):
+        self.args = [arg.fold(evaluator) for arg in self.args]
+        if evaluator is None:
+            return self
+        if not all(isinstance(arg, Literal) for arg in self.args):
+            return self
+        value = evaluator.call(self)
+        if value is None:
+            return self
+        return Literal(value, self.type)
+
+    def evaluate(self, evaluator):
+        values = [
+            cast_value(param.type, arg.type, arg.evaluate(evaluator))
+            for param, arg in zip(self.function.args, self.args)
+        ]
+        return evaluator.invoke(self.function, values)
+
+    def generate(self, builder, tail=False):
+        '''
+        Generates the call. `tail` is the tail call marker, as in
+        `IRBuilder.call`: 'tail', 'musttail' or False.
+        '''
+        args = []
+        for param, arg in zip(self.function.args, self.args):
+            conversion = cast_code(builder, param.type, arg.type)
+            args.append(conversion(arg.generate(builder)))
+        return builder.call(self.function.function, args, tail=tail)
 
     def _check_args_list(self, scope):
         ''' Checks if the argument list passed matches '''
@@ -79,6 +211,8 @@ class Call(Node):
 
 
 class Literal(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value, typ):
         super(Literal, self).__init__()
         self.value = value
@@ -87,5 +221,22 @@ class Literal(Node):
     def validate(self, scope):
         pass
 
-    def generate(self, _, scope):
+    def cast(self, typ):
+        '''
+        Returns a new literal with the value converted to the type, or None
+        when it is not a number or a boolean or has no conversion.
+        '''
+        if typ not in NUMERIC_TYPES and typ != Types.BOOLEAN:
+            return None
+        try:
+            return Literal(cast_value(typ, self.type, self.value), typ)
+        except (ArithmeticError, ValueError):
+            return None
+
+    def evaluate(self, evaluator):
+        if self.type not in NUMERIC_TYPES and self.type != Types.BOOLEAN:
+            raise NotConstant(self.value)
+        return cast_value(self.type, self.type, self.value)
+
+    def generate(self, _):
         return self.type.value(self.value)
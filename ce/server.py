@@ -0,0 +1,203 @@
+'''
+Compile server.
+
+Keeps the parser tables, llvmlite and the LLVM target loaded in a long lived
+process, and serves the requests of `ce.client` over a Unix socket. Each
+client is served by a thread, which compiles with a `ce.compiler.Session`
+of its own, so requests are compiled at the same time.
+
+Requests are dicts with:
+    command: 'compile', 'check' (validation only) or 'run' (compiles in the
+        server and JIT runs main in a child process, see `execute`).
+    file: Absolute path of the source, or `source`: the source text.
+    options: Fields of `ce.compiler.Options`.
+    kind: Output of 'compile', one of `backend.KINDS`.
+'''
+import os
+import json
+import queue
+import signal
+import socket
+import socketserver
+import multiprocessing
+
+import llvmlite.binding as llvm
+
+from ce import backend
+from ce.cache import DiskCache
+from ce.client import socket_path
+from ce.compiler import Options, Session, prepare, lower, optimize
+
+
+COMMANDS = ('compile', 'check', 'run')
+
+# Seconds the programs of 'run' requests may run
+RUN_TIMEOUT = 10
+
+# Children of 'run' requests are forked by a process started for them, with
+# the compiler loaded, as forking the threads of the server is not safe
+_processes = multiprocessing.get_context('forkserver')
+_processes.set_forkserver_preload(['ce.server'])
+
+
+class Handler(socketserver.StreamRequestHandler):
+    ''' Serves one request per connection '''
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            header, output = self.server.serve(request)
+        except Exception as e:
+            error = '%s: %s' % (type(e).__name__, e)
+            header, output = {'status': 'error', 'error': error}, b''
+        header['size'] = len(output)
+        try:
+            self.wfile.write(json.dumps(header).encode() + b'\n' + output)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client is gone
+            pass
+
+
+class CompileServer(socketserver.ThreadingUnixStreamServer):
+    '''
+    Compile server, listening on the socket at `path`.
+
+    Args:
+        path: Socket, see `ce.client.socket_path`.
+        cache: Looks the outputs of files up in the `DiskCache`, as main.py.
+        timeout: Seconds the programs of 'run' requests may run.
+    '''
+    daemon_threads = True
+
+    def __init__(self, path=None, cache=True, timeout=RUN_TIMEOUT):
+        self.path = path or socket_path()
+        self.cache = DiskCache('ir') if cache else None
+        self.timeout = timeout
+        # Idle sessions, one is created for each request served at once
+        self.sessions = queue.SimpleQueue()
+        self.sessions.put(Session(self.cache))
+        backend.target_machine()
+        _remove_stale(self.path)
+        super(CompileServer, self).__init__(self.path, Handler)
+
+    def server_close(self):
+        super(CompileServer, self).server_close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def serve(self, request):
+        '''
+        Serves the request.
+
+        Returns:
+            The header of the response and the bytes of the output.
+        '''
+        command = request.get('command')
+        if command not in COMMANDS:
+            raise ValueError('Unknown command "%s"' % command)
+        options = dict(request.get('options', {}))
+        options['passes'] = tuple(options.get('passes', ()))
+        options = Options(**options)
+        try:
+            session = self.sessions.get_nowait()
+        except queue.Empty:
+            session = Session(self.cache)
+        try:
+            return getattr(self, '_' + command)(session, request, options)
+        finally:
+            self.sessions.put(session)
+
+    def _tree(self, session, request):
+        if 'source' in request:
+            return session.parse(request['source'])
+        return session.parse_file(request['file'])
+
+    def _compile(self, session, request, options):
+        kind = request.get('kind', 'ir')
+        if 'source' in request:
+            output = session.compile(request['source'], options, kind)
+        else:
+            output = session.compile_file(request['file'], options, kind)
+        return {'status': 'ok'}, output
+
+    def _check(self, session, request, options):
+        prepare(self._tree(session, request), options)
+        return {'status': 'ok'}, b''
+
+    def _run(self, session, request, options):
+        module = lower(self._tree(session, request), options)
+        mod = optimize(module, options)
+        value = execute(mod.as_bitcode(), options.opt, self.timeout)
+        return {'status': 'ok', 'value': value}, b''
+
+
+def _execute(bitcode, level, connection):
+    ''' Runs main in the child, sending ('ok', value) or ('error', text) '''
+    try:
+        result = ('ok', backend.run(llvm.parse_bitcode(bitcode), level))
+    except Exception as e:
+        result = ('error', '%s: %s' % (type(e).__name__, e))
+    connection.send(result)
+
+
+def execute(bitcode, level='0', timeout=RUN_TIMEOUT):
+    '''
+    JIT compiles the bitcode and calls its main in a child process, so
+    programs that trap, crash or never return do not take the server down.
+
+    Returns:
+        The value returned by main.
+
+    Raises:
+        TimeoutError when main runs for over `timeout` seconds, the child
+        being killed. RuntimeError when the child dies, as on a failed
+        `--bounds-check`, or the module can not be run.
+    '''
+    receiver, sender = _processes.Pipe(duplex=False)
+    process = _processes.Process(target=_execute,
+                                 args=(bitcode, level, sender))
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            process.kill()
+            raise TimeoutError('main did not return in %g seconds' % timeout)
+        try:
+            status, result = receiver.recv()
+        except EOFError:
+            # Died before sending its result
+            status = None
+    finally:
+        process.join()
+        receiver.close()
+
+    if status == 'ok':
+        return result
+    if status == 'error':
+        raise RuntimeError(result)
+    code = process.exitcode
+    if code < 0:
+        raise RuntimeError('Program killed by %s' % signal.Signals(-code).name)
+    raise RuntimeError('Program exited with status %d' % code)
+
+
+def _remove_stale(path):
+    ''' Removes the socket left by a server that is gone '''
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except ConnectionRefusedError:
+            os.remove(path)
+            return
+    raise OSError('A server is already listening on %s' % path)
+
+
+def serve(path=None, cache=True):
+    ''' Serves until interrupted '''
+    with CompileServer(path, cache) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
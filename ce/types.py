@@ -1,3 +1,6 @@
+import math
+import struct
+import operator
 from enum import Enum
 from functools import partial
 
@@ -187,3 +190,99 @@ def int_operation(builder, operation):
         OpTypes.NE: partial(builder.icmp_signed, OpTypes.NE.value)
     }
     return table[operation]
+
+
+def _wrap(typ, value):
+    ''' Wraps the integer to the signed range of the type, as LLVM does '''
+    bits = typ.value.width
+    value &= (1 << bits) - 1
+    if value >> (bits - 1):
+        value -= 1 << bits
+    return value
+
+
+def _round(typ, value):
+    ''' Rounds the number to the precision of the float type '''
+    if typ == Types.FLOAT:
+        return struct.unpack('f', struct.pack('f', value))[0]
+    return value
+
+
+def cast_value(type_a, type_b, value):
+    '''
+    Converts the constant value of type_b to type_a. Same conversions as
+    `cast_code`, at compile time.
+
+    Raises:
+        ValueError or OverflowError when the value has no conversion, such
+        as a NaN to an integer.
+    '''
+    if type_a in INT_TYPES:
+        return _wrap(type_a, int(value))
+    if type_a in FLOAT_TYPES:
+        # Also rounds literals of the same type, which are parsed as doubles
+        return _round(type_a, float(value))
+    return value
+
+
+def _div(a, b):
+    ''' sdiv: rounds towards zero '''
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+def _rem(a, b):
+    ''' srem: the sign of the dividend '''
+    return a - b * _div(a, b)
+
+
+FOLD_OPS = {
+    OpTypes.ADD: operator.add,
+    OpTypes.SUB: operator.sub,
+    OpTypes.MUL: operator.mul,
+    OpTypes.GE: operator.ge,
+    OpTypes.LE: operator.le,
+    OpTypes.GT: operator.gt,
+    OpTypes.LT: operator.lt,
+    OpTypes.EQ: operator.eq,
+    OpTypes.NE: operator.ne,
+}
+
+
+def fold_operation(operation, typ, left, right):
+    '''
+    Computes the operation over constants at compile time, with the results
+    of `get_operation`.
+
+    Args:
+        operation: OpTypes enum.
+        typ: Numeric Types enum the operands were casted to.
+        left: Value of the left operand.
+        right: Value of the right operand.
+
+    Returns:
+        The value, or None when it is left to run time: divisions by zero,
+        signed overflow of divisions and comparisons with NaN.
+    '''
+    floats = typ in FLOAT_TYPES
+    if operation in BOOLEAN_OPS:
+        if floats and (math.isnan(left) or math.isnan(right)):
+            return None
+        return FOLD_OPS[operation](left, right)
+
+    if operation in (OpTypes.DIV, OpTypes.MOD):
+        if right == 0:
+            return None
+        if floats:
+            function = operator.truediv if operation == OpTypes.DIV \
+                else math.fmod
+            return _round(typ, function(left, right))
+        if right == -1 and left == _wrap(typ, 1 << (typ.value.width - 1)):
+            return None
+        function = _div if operation == OpTypes.DIV else _rem
+        return function(left, right)
+
+    value = FOLD_OPS[operation](left, right)
+    if floats:
+        return _round(typ, value)
+    return _wrap(typ, value)
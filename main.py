@@ -1,16 +1,18 @@
+import os
+import sys
+import json
+import tempfile
+import tracemalloc
 from argparse import ArgumentParser
 
-from ce.parser import create_parser
-
-
-def parse(filename):
-    ''' Parses the passed filename '''
-    parser = create_parser()
-    with open(filename, 'r') as f:
-        data = f.read()
-        parser = create_parser()
-        result = parser.parse(data)
-    return result
+from ce.backend import LEVELS, KINDS, link
+from ce.cache import DiskCache
+from ce.ctfe import STEPS
+from ce.client import exit_status
+from ce.compiler import Options, parse, generate, run, compile_file, \
+    compile_timed, link_files
+from ce.phases import Phases
+from ce.semantic.node import memory_report
 
 
 def create_argparse():
@@ -20,21 +22,357 @@ def create_argparse():
         '--file',
         '-f',
         type=str,
-        help='Parse file',
-        required=True
+        nargs='+',
+        help='Parse file. Several files are compiled apart, each object '
+             'cached by the hash of its source, and linked into an '
+             'executable'
+    )
+    arg_parser.add_argument(
+        '--debug',
+        action='store_true',
+        help='Rebuild the parser tables and write ce/parser.out'
+    )
+    arg_parser.add_argument(
+        '--memory',
+        action='store_true',
+        help='Print the memory used by the parse tree to stderr'
+    )
+    arg_parser.add_argument(
+        '--ssa',
+        action='store_true',
+        help='Promote local variables to SSA registers'
+    )
+    arg_parser.add_argument(
+        '-O',
+        dest='opt',
+        choices=LEVELS,
+        default='0',
+        help='Optimization level: -O0, -O1, -O2, -O3 or -Os'
+    )
+    arg_parser.add_argument(
+        '--no-fold',
+        dest='fold',
+        action='store_false',
+        help='Do not fold constant expressions before code generation'
+    )
+    arg_parser.add_argument(
+        '--ctfe',
+        type=int,
+        nargs='?',
+        const=STEPS,
+        default=0,
+        metavar='STEPS',
+        help='Evaluate the calls of pure functions with constant args at '
+             'compile time, taking up to STEPS steps each (default %d)'
+             % STEPS
+    )
+    arg_parser.add_argument(
+        '--bounds-check',
+        dest='checks',
+        action='store_true',
+        help='Abort on out of bounds array accesses. Not checked for the '
+             'counters of loops that stay within the bounds'
+    )
+    arg_parser.add_argument(
+        '--tail-loops',
+        action='store_true',
+        help='Rewrite self tail calls into loops. Other tail calls are '
+             'always emitted as tail calls'
+    )
+    arg_parser.add_argument(
+        '--jobs',
+        '-j',
+        type=int,
+        default=1,
+        metavar='N',
+        help='Emit the objects of big modules in partitions, in N processes, '
+             '0 for one per CPU. The output is the same'
+    )
+    arg_parser.add_argument(
+        '--lto',
+        action='store_true',
+        help='Link the files as bitcode and optimize them as one program, '
+             'so calls across files may be inlined. Only main is exported'
+    )
+    arg_parser.add_argument(
+        '--passes',
+        type=lambda x: tuple(x.split(',')),
+        default=(),
+        help='Comma separated passes to run after the level pipeline, '
+             'such as sroa,instruction_combine'
+    )
+    arg_parser.add_argument(
+        '--report-instructions',
+        action='store_true',
+        help='Print the instruction count of each function before and after '
+             'optimization to stderr. Skips the cache'
+    )
+    arg_parser.add_argument(
+        '--report-vectorization',
+        action='store_true',
+        help='Print which loops were vectorized, and with how many lanes, '
+             'to stderr. Skips the cache'
+    )
+    arg_parser.add_argument(
+        '--time-phases',
+        choices=('table', 'json'),
+        nargs='?',
+        const='table',
+        help='Print the wall and CPU time of each phase and function, the '
+             'nodes of the tree and the instructions emitted to stderr, as '
+             'a table (default) or JSON. Skips the cache'
+    )
+    arg_parser.add_argument(
+        '--phase-memory',
+        action='store_true',
+        help='With --time-phases, also report the peak Python memory of '
+             'each phase, traced with tracemalloc in a second compile, as '
+             'tracing slows the Python phases down several times'
+    )
+    arg_parser.add_argument(
+        '--run',
+        action='store_true',
+        help='JIT compile the program in-process and exit with the value '
+             'returned by main. Values that are not a status, out of 0 to '
+             '255 or not integers, are printed'
+    )
+    arg_parser.add_argument(
+        '--output',
+        '-o',
+        type=str,
+        help='Write the output to this file instead of stdout'
+    )
+    arg_parser.add_argument(
+        '--emit',
+        choices=KINDS + ('exe',),
+        help='Output: LLVM IR (default), bitcode, assembly, object or '
+             'executable, linked with $CC. Inferred from the extension of '
+             '--output (.ll, .bc, .s, .o, anything else is an executable)'
+    )
+    arg_parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not use the cache of compiled outputs'
+    )
+    arg_parser.add_argument(
+        '--serve',
+        action='store_true',
+        help='Serve the requests of `python -m ce.client` over a Unix socket '
+             'until interrupted, keeping the compiler loaded'
+    )
+    arg_parser.add_argument(
+        '--socket',
+        help='Socket of --serve, $CE_SOCKET or ce.sock in $XDG_RUNTIME_DIR or '
+             'in a private directory of the user in the temp dir'
+    )
+    arg_parser.add_argument(
+        '--cache-stats',
+        action='store_true',
+        help='Print the hit/miss statistics of the cache and exit'
     )
     return arg_parser
 
 
-arg_parser = create_argparse()
-args = arg_parser.parse_args()
-result = parse(args.file)
+def print_memory(tree):
+    ''' Prints the memory report of the tree '''
+    report = memory_report(tree)
+    print('%-14s %10s %12s' % ('node', 'count', 'bytes'), file=sys.stderr)
+    for name, (count, size) in sorted(report['classes'].items()):
+        print('%-14s %10d %12d' % (name, count, size), file=sys.stderr)
+    total = ('total', report['nodes'], report['bytes'])
+    print('%-14s %10d %12d' % total, file=sys.stderr)
+
+
+def print_instructions(report):
+    ''' Prints the instruction counts of each function '''
+    header = ('function', 'before', 'after')
+    print('%-20s %8s %8s' % header, file=sys.stderr)
+    for name, (before, after) in report.items():
+        print('%-20s %8d %8d' % (name, before, after), file=sys.stderr)
+
+
+def print_vectorization(loops):
+    ''' Prints the vectorization width of each loop '''
+    print('%-30s %s' % ('loop', 'vectorized'), file=sys.stderr)
+    for name, width in loops.items():
+        if width is None:
+            status = 'removed'
+        elif width > 1:
+            status = 'yes, %d lanes' % width
+        else:
+            status = 'no'
+        print('%-30s %s' % (name, status), file=sys.stderr)
+
+
+def print_phases(phases, fmt):
+    ''' Prints the measures of the phases, as a table or JSON '''
+    if fmt == 'json':
+        print(json.dumps(phases.as_dict(), indent=2), file=sys.stderr)
+        return
+
+    def kib(peak):
+        return '-' if peak is None else '%.1f' % (peak / 1024)
+
+    header = ('phase', 'wall ms', 'cpu ms', 'peak KiB')
+    print('%-12s %10s %10s %10s' % header, file=sys.stderr)
+    for name, wall, cpu, peak in phases.phases:
+        row = (name, wall * 1000, cpu * 1000, kib(peak))
+        print('%-12s %10.2f %10.2f %10s' % row, file=sys.stderr)
+    wall = sum(phase[1] for phase in phases.phases)
+    cpu = sum(phase[2] for phase in phases.phases)
+    peaks = [phase[3] for phase in phases.phases if phase[3] is not None]
+    row = ('total', wall * 1000, cpu * 1000, kib(max(peaks, default=None)))
+    print('%-12s %10.2f %10.2f %10s' % row, file=sys.stderr)
+    print('nodes %d, instructions %d' % (
+        phases.nodes, sum(phases.instructions.values())), file=sys.stderr)
+
+    steps = ('validate', 'fold', 'generate')
+    header = ('function',) + tuple(s + ' ms' for s in steps) + \
+        ('peak KiB', 'instructions')
+    print('\n%-20s %11s %11s %11s %10s %12s' % header, file=sys.stderr)
+    zero = (0, 0, None)
+    for name, measures in phases.functions.items():
+        walls = tuple(measures.get(s, zero)[0] * 1000 for s in steps)
+        peaks = [m[2] for m in measures.values() if m[2] is not None]
+        row = (name,) + walls + (kib(max(peaks, default=None)),
+                                 phases.instructions.get(name, 0))
+        print('%-20s %11.2f %11.2f %11.2f %10s %12d' % row,
+              file=sys.stderr)
+
+
+def print_cache_stats(cache):
+    ''' Prints the statistics of the cache '''
+    stats = cache.stats()
+    total = stats['hits'] + stats['misses']
+    ratio = stats['hits'] / total if total else 0
+    print('path     %s' % cache.path)
+    print('hits     %d (%.1f%%)' % (stats['hits'], ratio * 100))
+    print('misses   %d' % stats['misses'])
+    print('entries  %d' % stats['entries'])
+    print('size     %d / %d bytes' % (stats['bytes'], stats['limit']))
+
+
+# Kinds of output by extension of the output file
+EXTENSIONS = {'.ll': 'ir', '.ir': 'ir', '.bc': 'bc', '.s': 'asm', '.o': 'obj'}
+
+
+def output_kind(args):
+    ''' Kind of output requested by --emit or the extension of --output '''
+    if args.emit is not None:
+        return args.emit
+    if args.output is None:
+        return 'ir'
+    _, extension = os.path.splitext(args.output)
+    return EXTENSIONS.get(extension, 'exe')
+
+
+def write(output, filename):
+    ''' Writes the bytes of the output to the file, or to stdout '''
+    if filename is None:
+        sys.stdout.buffer.write(output)
+        sys.stdout.flush()
+        return
+    with open(filename, 'wb') as f:
+        f.write(output)
+
+
+def build(outputs, filename):
+    ''' Links the objects into the executable `filename` '''
+    with tempfile.TemporaryDirectory() as path:
+        objects = []
+        for i, output in enumerate(outputs):
+            objects.append(os.path.join(path, 'unit%d.o' % i))
+            write(output, objects[-1])
+        link(objects, filename or 'a.out')
+
+
+#
+# Scripting part
+#
+if __name__ == '__main__':
+    arg_parser = create_argparse()
+    args = arg_parser.parse_args()
+
+    cache = DiskCache('ir')
+    if args.cache_stats:
+        print_cache_stats(cache)
+        sys.exit()
+    if args.serve:
+        # Only here, as it sets up the processes of run requests
+        from ce.server import serve
+        serve(args.socket, cache=not args.no_cache)
+        sys.exit()
+    if args.file is None:
+        arg_parser.error('the following arguments are required: --file/-f')
+
+    options = Options(
+        ssa=args.ssa, opt=args.opt, passes=args.passes, fold=args.fold,
+        ctfe=args.ctfe, checks=args.checks, tail_loops=args.tail_loops)
+    reports = args.memory or args.report_instructions or \
+        args.report_vectorization
+    kind = output_kind(args)
+    several = len(args.file) > 1
+    if several and (args.run or reports or args.time_phases or
+                    kind != 'exe' and not args.lto):
+        arg_parser.error('several files can only be linked into an '
+                         'executable, or with --lto')
+    filename = args.file[0]
+
+    if args.run:
+        sys.exit(exit_status(run(parse(filename, args.debug), options)))
 
-result.validate()
-module = result.generate()
+    if args.time_phases:
+        unit = 'obj' if kind == 'exe' else kind
+        phases = Phases()
+        output = compile_timed(filename, phases, options, unit, args.debug,
+                               args.jobs)
+        if args.phase_memory:
+            traced = Phases()
+            tracemalloc.start()
+            try:
+                compile_timed(filename, traced, options, unit, args.debug)
+            finally:
+                tracemalloc.stop()
+            phases.add_peaks(traced)
+        if kind == 'exe':
+            with phases.phase('link'):
+                build([output], args.output)
+        else:
+            write(output, args.output)
+        print_phases(phases, args.time_phases)
+        sys.exit()
 
-# remove first 3 lines of module
-module = str(module)
-module = module.split('\n', 3)[3]
+    if reports:
+        result = parse(filename, args.debug)
+        if args.memory:
+            print_memory(result)
+        report = {} if args.report_instructions else None
+        loops = {} if args.report_vectorization else None
+        module = generate(result, options, report, loops)
+        if report is not None:
+            print_instructions(report)
+        if loops is not None:
+            print_vectorization(loops)
+        print(module)
+        sys.exit()
 
-print(module)
+    if args.no_cache or args.debug:
+        cache = None
+    if args.lto:
+        output = link_files(args.file, options, cache, args.debug,
+                            'obj' if kind == 'exe' else kind, args.jobs)
+        if kind == 'exe':
+            build([output], args.output)
+        else:
+            write(output, args.output)
+    elif kind == 'exe':
+        # Only the files that changed are compiled again
+        outputs = [
+            compile_file(name, options, cache, args.debug, 'obj', args.jobs)
+            for name in args.file
+        ]
+        build(outputs, args.output)
+    else:
+        output = compile_file(
+            filename, options, cache, args.debug, kind, args.jobs)
+        write(output, args.output)
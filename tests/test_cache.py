@@ -0,0 +1,65 @@
+import os
+import tempfile
+import multiprocessing
+from unittest import TestCase, mock
+
+from ce.cache import DiskCache, cache_dir
+
+
+def _miss(count):
+    ''' Looks up missing keys in a process of its own '''
+    cache = DiskCache('test')
+    for _ in range(count):
+        cache.get('missing')
+
+
+class TestDiskCache(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        patch = mock.patch.dict(os.environ, {'CE_CACHE_DIR': self.dir.name})
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.addCleanup(self.dir.cleanup)
+
+    def test_cache_dir(self):
+        path = cache_dir('a', 'b')
+        self.assertEqual(path, os.path.join(self.dir.name, 'a', 'b'))
+        self.assertTrue(os.path.isdir(path))
+
+    def test_key(self):
+        ''' Parts are not ambiguous '''
+        self.assertNotEqual(DiskCache.key('ab', 'c'), DiskCache.key('a', 'bc'))
+        self.assertEqual(DiskCache.key('a', 'b'), DiskCache.key('a', 'b'))
+
+    def test_get_put(self):
+        cache = DiskCache('test')
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', b'data')
+        self.assertEqual(cache.get('a'), b'data')
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['bytes'], 4)
+
+    def test_evict(self):
+        ''' Least recently used entries are removed first '''
+        cache = DiskCache('test', limit=10)
+        cache.put('a', b'1234')
+        cache.put('b', b'1234')
+        os.utime(os.path.join(cache.path, 'a'), (0, 0))
+        os.utime(os.path.join(cache.path, 'b'), (1, 1))
+        cache.get('a')
+        cache.put('c', b'1234')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'1234')
+        self.assertEqual(cache.get('c'), b'1234')
+
+    def test_processes(self):
+        ''' Counts of processes using the cache at the same time add up '''
+        with multiprocessing.get_context('spawn').Pool(4) as pool:
+            pool.map(_miss, [100] * 4)
+        stats = DiskCache('test').stats()
+        self.assertEqual(stats['misses'], 400)
+        self.assertEqual(stats['entries'], 0)
@@ -0,0 +1,683 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase, mock, skipIf
+
+import llvmlite.binding as llvm
+
+from ce import backend
+from ce.compiler import Options, Session, emit, generate, link_files, \
+    run as run_tree
+from ce.parser import create_parser
+from ce.semantic.expressions import OpBin
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+
+
+def compile(data):
+    ''' Parses, validates and generates the source '''
+    tree = create_parser(debug=False, cache=True).parse(data)
+    tree.validate()
+    return tree.generate()
+
+
+def run(module):
+    ''' JIT compiles the module and returns the result of `main` '''
+    return backend.run(backend.parse(module))
+
+
+class TestAlloca(TestCase):
+    ''' Local variables are allocated in the entry block '''
+    data = '''
+    medio main() {
+        medio total = 0;
+        para (medio i = 0; i < 100000000; i = i + 1) {
+            medio x = i % 7;
+            total = total + x;
+        }
+        medio j = 0;
+        enquanto (j < 10) {
+            medio y = j;
+            j = y + 1;
+        }
+        devolve total % 1000 + j;
+    }
+    '''
+
+    def test_entry_block(self):
+        module = compile(self.data)
+        main = module.get_global('main')
+        allocas = [
+            i for b in main.blocks for i in b.instructions
+            if i.opname == 'alloca'
+        ]
+        self.assertEqual(len(allocas), 5)
+        entry = main.blocks[0]
+        self.assertTrue(all(i.parent is entry for i in allocas))
+
+    def test_loop(self):
+        ''' 10^8 iterations declaring a local run in constant stack '''
+        total = sum(i % 7 for i in range(7)) * (10 ** 8 // 7)
+        total += sum(i % 7 for i in range(10 ** 8 % 7))
+        self.assertEqual(run(compile(self.data)), total % 1000 + 10)
+
+    def test_promote(self):
+        ''' No alloca is left after promotion '''
+        mod = backend.promote(backend.parse(compile(self.data)))
+        self.assertNotIn('alloca', str(mod))
+        self.assertIn('phi', str(mod))
+
+
+class TestOptimize(TestCase):
+    data = '''
+    comprido fact(medio a) {
+        se (a < 2) { devolve 1; }
+        comprido mul = 1;
+        para (medio i = 1; i <= a; i = i + 1) { mul = mul * i; }
+        devolve mul;
+    }
+    medio main() { devolve fact(5); }
+    '''
+
+    def test_levels(self):
+        ''' Every level keeps the result and none adds instructions '''
+        module = compile(self.data)
+        before = backend.instruction_counts(backend.parse(module))
+        for level in backend.LEVELS:
+            mod = backend.optimize(backend.parse(module), level)
+            after = backend.instruction_counts(mod)
+            for name, count in after.items():
+                self.assertLessEqual(count, before[name], level)
+            self.assertEqual(run(str(mod)), 120)
+
+    def test_passes(self):
+        mod = backend.optimize(backend.parse(compile(self.data)), '0',
+                               ['sroa', 'instruction_combine'])
+        self.assertNotIn('alloca', str(mod))
+
+    def test_unknown(self):
+        mod = backend.parse(compile(self.data))
+        with self.assertRaises(ValueError):
+            backend.optimize(mod, '4')
+        with self.assertRaises(ValueError):
+            backend.optimize(mod, '0', ['unknown'])
+
+
+class TestRun(TestCase):
+    def test_return_types(self):
+        ''' Value of main, converted from its return type '''
+        programs = (
+            ('medio main() { devolve 2 + 3; }', 5),
+            ('comprido main() { comprido a = 50000; devolve a * 100000; }',
+             5000000000),
+            ('flutua main() { devolve 1.5; }', 1.5),
+            ('opiniao main() { devolve concordo; }', True),
+        )
+        for data, expected in programs:
+            self.assertEqual(run(compile(data)), expected, data)
+
+    def test_main(self):
+        ''' main.py --run exits with integers, and prints the others '''
+        programs = (
+            ('medio main() { devolve 42; }', 42, b''),
+            ('medio main() { devolve 300; }', 44, b'300\n'),
+            ('flutua main() { devolve 2.5; }', 0, b'2.5\n'),
+        )
+        with tempfile.TemporaryDirectory() as path:
+            filename = os.path.join(path, 'a.ce')
+            for data, status, output in programs:
+                with open(filename, 'w') as f:
+                    f.write(data)
+                process = subprocess.run(
+                    [sys.executable, MAIN, '-f', filename, '--run'],
+                    capture_output=True)
+                self.assertEqual(process.returncode, status, data)
+                self.assertEqual(process.stdout, output, data)
+
+    def test_levels(self):
+        ''' The optimization level is passed through '''
+        data = 'medio f(medio a) { devolve a * 2; } ' \
+            'medio main() { devolve f(21); }'
+        parser = create_parser(debug=False, cache=True)
+        for level in backend.LEVELS:
+            tree = parser.parse(data)
+            self.assertEqual(run_tree(tree, Options(opt=level)), 42)
+
+
+class TestEmit(TestCase):
+    data = 'medio main() { medio a = 6; devolve a * 7; }'
+
+    def test_kinds(self):
+        ''' Each kind of output is emitted in-process '''
+        parser = create_parser(debug=False, cache=True)
+        outputs = {
+            kind: emit(parser.parse(self.data), Options(), kind)
+            for kind in backend.KINDS
+        }
+        self.assertIn(b'define i32 @"main"()', outputs['ir'])
+        self.assertTrue(outputs['bc'].startswith(b'BC'))
+        self.assertIn(b'main:', outputs['asm'])
+        self.assertTrue(outputs['obj'].startswith(b'\x7fELF'))
+
+    def test_unknown(self):
+        mod = backend.parse(compile(self.data))
+        with self.assertRaises(ValueError):
+            backend.emit(mod, 'exe')
+
+    @skipIf(shutil.which(os.environ.get('CC', 'cc')) is None, 'no linker')
+    def test_link(self):
+        ''' The object links into an executable '''
+        tree = create_parser(debug=False, cache=True).parse(self.data)
+        obj = emit(tree, Options(opt='2'), 'obj')
+        with tempfile.TemporaryDirectory() as path:
+            filename = os.path.join(path, 'out.o')
+            with open(filename, 'wb') as f:
+                f.write(obj)
+            output = os.path.join(path, 'a.out')
+            backend.link([filename], output)
+            self.assertEqual(subprocess.run([output]).returncode, 42)
+
+
+class TestArray(TestCase):
+    data = '''
+    medio g[4][3];
+
+    medio main() {
+        duplo m[3][4];
+        para (medio i = 0; i < 3; i = i + 1) {
+            para (medio j = 0; j < 4; j = j + 1) {
+                m[i][j] = i * 10 + j;
+                g[j][i] = i + j;
+            }
+        }
+        medio total = 0;
+        para (medio k = 0; k < 12; k = k + 1) {
+            total = total + g[k / 3][k % 3];
+        }
+        devolve m[2][3] + total;
+    }
+    '''
+
+    def test_index(self):
+        ''' Elements are stored in row-major order '''
+        self.assertEqual(run(compile(self.data)), 53)
+        tree = create_parser(debug=False, cache=True).parse(self.data)
+        self.assertEqual(run_tree(tree, Options(checks=True, opt='2')), 53)
+
+    def test_strides(self):
+        data = 'medio main() { medio a[2][3][4]; a[1][2][3] = 7; ' \
+            'devolve a[1][2][3]; }'
+        module = compile(data)
+        self.assertIn('[24 x i32]', str(module))
+        self.assertIn('i64 0, i64 23', str(module))
+        self.assertEqual(run(module), 7)
+
+    def test_elided(self):
+        ''' Loop counters within the bounds are not checked '''
+        tree = create_parser(debug=False, cache=True).parse(self.data)
+        ir = generate(tree, Options(checks=True))
+        self.assertEqual(ir.count('call void @"llvm.trap"()'), 2)
+        tree = create_parser(debug=False, cache=True).parse(self.data)
+        self.assertNotIn('llvm.trap', generate(tree))
+
+    def test_out_of_bounds(self):
+        ''' Checked accesses abort the program '''
+        data = 'medio main() { medio a[3]; medio i = 1; i = i + 2; ' \
+            'a[i] = 1; devolve 0; }'
+        with tempfile.TemporaryDirectory() as path:
+            filename = os.path.join(path, 'a.ce')
+            with open(filename, 'w') as f:
+                f.write(data)
+            command = [sys.executable, MAIN, '-f', filename, '--run',
+                       '--bounds-check']
+            self.assertLess(subprocess.run(command).returncode, 0)
+
+    def test_constant_index(self):
+        with self.assertRaises(IndexError):
+            compile('medio main() { medio a[3]; devolve a[3]; }')
+
+    def test_dimensions(self):
+        with self.assertRaises(Exception):
+            compile('medio main() { medio a[3]; devolve a[1][1]; }')
+
+
+class TestLoops(TestCase):
+    data = '''
+    medio a[1024];
+    medio b[1024];
+
+    medio main() {
+        @vetoriza(8) @desenrola(2)
+        para (medio i = 0; i < 1024; i = i + 1) {
+            a[i] = i * 3;
+        }
+        medio j = 0;
+        @independente
+        enquanto (j < 1024) {
+            b[j] = a[j] + 1;
+            j = j + 1;
+        }
+        medio total = 0;
+        para (medio k = 0; k < 1024; k = k + 1) {
+            total = total + b[k];
+        }
+        devolve total % 251;
+    }
+    '''
+
+    def parse(self):
+        return create_parser(debug=False, cache=True).parse(self.data)
+
+    def test_metadata(self):
+        ''' Hints become properties of the loop IDs '''
+        ir = generate(self.parse())
+        self.assertIn('!"llvm.loop.vectorize.width", i32 8', ir)
+        self.assertIn('!"llvm.loop.unroll.count", i32 2', ir)
+        self.assertIn('!"llvm.loop.parallel_accesses"', ir)
+        self.assertIn('!"ce.loop", !"main: para 3"', ir)
+        self.assertEqual(ir.count('!llvm.loop'), 3)
+
+    def test_report(self):
+        loops = {}
+        generate(self.parse(), Options(opt='2'), loops=loops)
+        self.assertEqual(loops['main: para 1'], 8)
+        self.assertGreater(loops['main: enquanto 2'], 1)
+        loops = {}
+        generate(self.parse(), Options(), loops=loops)
+        self.assertEqual(set(loops.values()), {1})
+
+    def test_run(self):
+        expected = sum(3 * i + 1 for i in range(1024)) % 251
+        for level in ('0', '3'):
+            value = run_tree(self.parse(), Options(opt=level))
+            self.assertEqual(value, expected)
+
+    def test_unknown(self):
+        with self.assertRaises(SyntaxError):
+            compile('nada f() { @rapido enquanto (concordo) { } }')
+
+
+class TestTailCall(TestCase):
+    data = '''
+    comprido soma(medio n, comprido acc) {
+        se (n == 0) {
+            devolve acc;
+        }
+        devolve soma(n - 1, acc + n);
+    }
+
+    curto metade(comprido n) {
+        devolve n / 2;
+    }
+
+    medio outra(comprido n) {
+        devolve metade(n);
+    }
+
+    comprido main() {
+        devolve soma(10000000, 0) + outra(6);
+    }
+    '''
+    expected = sum(range(10000001)) + 3
+
+    def parse(self):
+        return create_parser(debug=False, cache=True).parse(self.data)
+
+    def test_markers(self):
+        ''' Calls in tail position are tail calls '''
+        ir = generate(self.parse())
+        self.assertIn('musttail call i64 @"soma"', ir)
+        self.assertIn('tail call i16 @"metade"', ir)
+        self.assertNotIn('musttail call i16', ir)
+
+    def test_accumulator(self):
+        ''' Tail calls of other functions outlive tail call elimination '''
+        checks = '\n'.join('se (a > %d) { t = t * 3 + a %% %d; }' % (i, i + 7)
+                           for i in range(100))
+        data = '''
+        medio big(medio a) { medio t = a; %s devolve t; }
+        medio f(medio n) {
+            se (n < 1) { devolve big(n); }
+            devolve f(n - 1) + 2;
+        }
+        medio main() { devolve f(3); }
+        ''' % checks
+        tree = create_parser(debug=False, cache=True).parse(data)
+        obj = emit(tree, Options(opt='2'), 'obj')
+        self.assertTrue(obj.startswith(b'\x7fELF'))
+
+    def test_deep(self):
+        ''' Recursing 10^7 levels deep does not grow the stack '''
+        for level in ('0', '2'):
+            value = run_tree(self.parse(), Options(opt=level))
+            self.assertEqual(value, self.expected)
+
+    def test_loops(self):
+        ''' Self tail calls become jumps back to the body '''
+        options = Options(tail_loops=True)
+        ir = generate(self.parse(), options)
+        self.assertNotIn('call i64 @"soma"(i32 %', ir)
+        self.assertEqual(run_tree(self.parse(), options), self.expected)
+
+
+class TestSwitch(TestCase):
+    data = '''
+    medio densa(medio x) {
+        medio r = 0;
+        caso (x) {
+            seja (1) { r = 10; }
+            seja (2) { r = 20; }
+            seja (3) { r = 30; }
+            seja (5) { devolve 50; }
+            senao { r = 0 - 1; }
+        }
+        devolve r;
+    }
+
+    medio esparsa(medio x) {
+        medio r = 0;
+        caso (x) {
+            seja (1000) { r = 1; }
+            seja (-7) { r = 2; }
+            seja (42) { r = 3; }
+            seja (100000) { r = 4; }
+            seja (7) { r = 5; }
+            seja (99) { r = 6; }
+        }
+        devolve r;
+    }
+    '''
+    dense = {1: 10, 2: 20, 3: 30, 5: 50, 4: -1, 0: -1, 6: -1}
+    sparse = {1000: 1, -7: 2, 42: 3, 100000: 4, 7: 5, 99: 6, 8: 0, -8: 0}
+
+    def value(self, function, x, options=Options()):
+        data = self.data + 'medio main() { devolve %s(%d); }' % (function, x)
+        tree = create_parser(debug=False, cache=True).parse(data)
+        return run_tree(tree, options)
+
+    def test_lowering(self):
+        ''' Dense labels use a jump table, sparse ones a binary search '''
+        ir = generate(create_parser(debug=False, cache=True).parse(self.data))
+        dense, sparse = ir.split('define i32 @"esparsa"')
+        self.assertIn('switch i32', dense)
+        self.assertNotIn('switch i32', sparse)
+        self.assertIn('icmp slt', sparse)
+
+    def test_values(self):
+        for options in (Options(), Options(opt='2'), Options(fold=False)):
+            for x, expected in self.dense.items():
+                self.assertEqual(self.value('densa', x, options), expected)
+            for x, expected in self.sparse.items():
+                self.assertEqual(self.value('esparsa', x, options), expected)
+
+    def test_evaluate(self):
+        ''' Evaluated at compile time with the same semantics '''
+        options = Options(ctfe=1000)
+        for x, expected in self.dense.items():
+            self.assertEqual(self.value('densa', x, options), expected)
+
+    def test_labels(self):
+        ''' Labels are checked by validation, without generating code '''
+        for labels, error in (('1) {} seja (1', ValueError),
+                              ('x', TypeError), ('1.5', TypeError),
+                              ('f(1)', TypeError), ('1) {} seja (2 - 1',
+                                                    ValueError)):
+            data = 'medio f(medio x) { caso (x) { seja (%s) {} } ' \
+                   'devolve 0; }' % labels
+            tree = create_parser(debug=False, cache=True).parse(data)
+            with self.assertRaises(error, msg=labels):
+                tree.validate()
+
+    def test_no_fold(self):
+        ''' Labels are not folded in the tree without folding '''
+        data = 'medio main() { caso (3) { seja (1 + 2) { devolve 7; } } ' \
+               'devolve 0; }'
+        tree = create_parser(debug=False, cache=True).parse(data)
+        self.assertEqual(run_tree(tree, Options(fold=False)), 7)
+        self.assertIsInstance(tree.commands[0].block.commands[0].cases[0]
+                              .expr, OpBin)
+
+
+class TestJobs(TestCase):
+    data = '''
+    medio g = 3;
+    medio a[64];
+
+    medio pick(medio x) {
+        caso (x) {
+            seja (0) { devolve 11; }
+            seja (1) { devolve 13; }
+            seja (2) { devolve 17; }
+            seja (3) { devolve 19; }
+            senao { devolve 23; }
+        }
+        devolve 0;
+    }
+
+    medio fill(medio n) {
+        para (medio i = 0; i < 64; i = i + 1) { a[i] = pick(i % 5) * g; }
+        devolve a[n % 64];
+    }
+
+    medio fib(medio n) {
+        se (n < 2) { devolve n; }
+        devolve fib(n - 1) + fib(n - 2);
+    }
+
+    medio main() { devolve fill(7) + fib(10) + g; }
+    '''
+
+    def setUp(self):
+        # Partitions of a few lines, so the small program is split
+        patch = mock.patch.object(backend, 'PARTITION_SIZE', 10)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def emit(self, options, jobs):
+        tree = create_parser(debug=False, cache=True).parse(self.data)
+        return emit(tree, options, 'obj', jobs)
+
+    def test_partitions(self):
+        text = str(compile(self.data))
+        self.assertEqual(backend.partitions(text, 1000),
+                         [['pick', 'fill', 'fib', 'main']])
+        parts = backend.partitions(text, 10)
+        self.assertGreater(len(parts), 1)
+        self.assertEqual(sum(parts, []), ['pick', 'fill', 'fib', 'main'])
+
+    def test_same_output(self):
+        ''' The output does not depend on the number of processes '''
+        for options in (Options(), Options(opt='2')):
+            serial = self.emit(options, 1)
+            self.assertEqual(self.emit(options, 2), serial, options)
+            self.assertEqual(self.emit(options, 0), serial, options)
+
+    @skipIf(shutil.which(os.environ.get('CC', 'cc')) is None, 'no linker')
+    def test_link(self):
+        ''' The linked partitions share the globals and private symbols '''
+        with tempfile.TemporaryDirectory() as path:
+            source = os.path.join(path, 'a.ce')
+            with open(source, 'w') as f:
+                f.write(self.data)
+            objects = {
+                'obj': self.emit(Options(opt='2'), 2),
+                # Internalized, but main
+                'lto': link_files([source], Options(), jobs=2),
+            }
+            # The internal functions were exported, renamed
+            self.assertIn(b'fib.', objects['lto'])
+            for name, obj in objects.items():
+                filename = os.path.join(path, name + '.o')
+                with open(filename, 'wb') as f:
+                    f.write(obj)
+                output = os.path.join(path, name)
+                backend.link([filename], output)
+                # 17 * 3 + 55 + 3
+                self.assertEqual(subprocess.run([output]).returncode, 109,
+                                 name)
+
+
+class TestPrototypes(TestCase):
+    data = '''
+    medio dobro(medio x);
+
+    medio main() { devolve dobro(20) + 2; }
+
+    medio dobro(medio x) { devolve x * 2; }
+    '''
+
+    def test_declared(self):
+        ''' Functions may be called before their definition '''
+        self.assertEqual(run(compile(self.data)), 42)
+        ir = str(compile('medio f(medio x); medio main() { devolve f(1); }'))
+        self.assertIn('declare i32 @"f"(i32', ir)
+
+    def test_order(self):
+        ''' Definitions take the place of their declarations, as linked '''
+        ir = str(compile(self.data))
+        self.assertLess(ir.index('@"main"'), ir.index('define i32 @"dobro"'))
+
+    def test_mismatch(self):
+        for data in ('medio f(medio x); comprido f(medio x) { devolve x; }',
+                     'medio f(medio x); medio f(curto x) { devolve x; }',
+                     'medio f(medio x) { devolve x; } medio f(medio y);'
+                     ' medio f(medio z) { devolve z; }'):
+            with self.assertRaises(Exception, msg=data):
+                compile(data)
+        with self.assertRaises(TypeError):
+            compile('medio f(medio x); medio f() { devolve 1; }')
+
+    def test_undefined(self):
+        ''' Running a prototype without definition fails, not crashes '''
+        data = 'medio f(medio x); medio main() { devolve f(2); }'
+        with self.assertRaisesRegex(NameError, 'Function "f"'):
+            run(compile(data))
+        with tempfile.TemporaryDirectory() as path:
+            filename = os.path.join(path, 'a.ce')
+            with open(filename, 'w') as f:
+                f.write(data)
+            process = subprocess.run(
+                [sys.executable, MAIN, '-f', filename, '--run'],
+                capture_output=True)
+        self.assertEqual(process.returncode, 1)
+        self.assertIn(b'NameError', process.stderr)
+
+    @skipIf(shutil.which(os.environ.get('CC', 'cc')) is None, 'no linker')
+    def test_files(self):
+        ''' Files are compiled apart and linked, with their objects cached '''
+        sources = {
+            'main.ce': 'medio dobro(medio x); '
+                       'medio main() { devolve dobro(20) + 2; }',
+            'dobro.ce': 'medio dobro(medio x) { devolve x * 2; }',
+        }
+        with tempfile.TemporaryDirectory() as path:
+            files = []
+            for name, data in sources.items():
+                files.append(os.path.join(path, name))
+                with open(files[-1], 'w') as f:
+                    f.write(data)
+            output = os.path.join(path, 'a.out')
+            env = dict(os.environ, CE_CACHE_DIR=os.path.join(path, 'cache'))
+            command = [sys.executable, MAIN, '-f', *files, '-o', output]
+            subprocess.run(command, check=True, env=env)
+            self.assertEqual(subprocess.run([output]).returncode, 42)
+
+            # Only the changed file is compiled again
+            with open(files[1], 'w') as f:
+                f.write('medio dobro(medio x) { devolve x * 3; }')
+            subprocess.run(command, check=True, env=env)
+            self.assertEqual(subprocess.run([output]).returncode, 62)
+            stats = subprocess.run(
+                [sys.executable, MAIN, '--cache-stats'], env=env,
+                check=True, stdout=subprocess.PIPE).stdout
+            self.assertIn(b'hits     1 ', stats)
+
+
+class TestLTO(TestCase):
+    sources = {
+        'main.ce': 'medio soma(medio a, medio b); medio g = 5; '
+                   'medio main() { devolve soma(g, 37); }',
+        'soma.ce': 'medio soma(medio a, medio b) { devolve a + b; }',
+    }
+
+    def link(self, options):
+        with tempfile.TemporaryDirectory() as path:
+            files = []
+            for name, data in self.sources.items():
+                files.append(os.path.join(path, name))
+                with open(files[-1], 'w') as f:
+                    f.write(data)
+            return link_files(files, options, kind='ir').decode()
+
+    def test_inline(self):
+        ''' Calls across files are inlined, and only main is exported '''
+        ir = self.link(Options(opt='2'))
+        self.assertNotIn('soma', ir)
+        self.assertIn('ret i32 42', ir)
+
+    def test_internalize(self):
+        ir = self.link(Options())
+        self.assertIn('define internal i32 @soma', ir)
+        self.assertIn('@g = internal global', ir)
+        self.assertIn('define i32 @main', ir)
+        self.assertEqual(backend.run(llvm.parse_assembly(ir)), 42)
+
+
+class TestSession(TestCase):
+    data = '''
+medio dobro(medio x);
+medio main() {
+    medio total = 0;
+    para (medio i = 0; i < %d; i = i + 1) {
+        se (i > 2) { total = total + dobro(i); }
+    }
+    devolve total;
+}
+medio dobro(medio x) { devolve x * 2; }
+'''
+
+    def test_concurrent(self):
+        ''' 64 compiles at the same time give the outputs of serial ones '''
+        count = 64
+        sources = [self.data % i for i in range(count)]
+        kinds = ('ir', 'obj')
+        options = Options(opt='2')
+        session = Session()
+        expected = [session.compile(source, options, kinds[i % 2])
+                    for i, source in enumerate(sources)]
+        values = [session.run(source) for source in sources]
+        barrier = threading.Barrier(count)
+
+        def work(i):
+            session = Session()
+            barrier.wait()
+            output = session.compile(sources[i], options, kinds[i % 2])
+            return output, session.run(sources[i])
+
+        # Switches threads often, so they stop halfway through the parses
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            with ThreadPoolExecutor(count) as pool:
+                results = list(pool.map(work, range(count)))
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(results, list(zip(expected, values)))
+        self.assertEqual(values[5], 2 * (3 + 4))
+
+    def test_errors(self):
+        ''' A failed compile does not break the session '''
+        session = Session()
+        with self.assertRaises(Exception):
+            session.check('medio main() { devolve x; }')
+        with self.assertRaises(SyntaxError):
+            session.parse('medio main() { devolve 1 § 2; }')
+        with self.assertRaises(SyntaxError):
+            session.parse('medio main() { devolve 1 }')
+        self.assertEqual(session.run(self.data % 4), 6)
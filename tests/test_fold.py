@@ -0,0 +1,167 @@
+import os
+from unittest import TestCase
+
+from ce.compiler import Options, generate, run
+from ce.ctfe import STEPS
+from ce.parser import create_parser
+from ce.semantic.values import Literal
+from ce.types import Types, OpTypes, fold_operation
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse(data):
+    return create_parser(debug=False, cache=True).parse(data)
+
+
+class TestFold(TestCase):
+    def test_literals(self):
+        ''' Constant expressions become a single constant '''
+        ir = generate(parse('medio main() { devolve 10 * 4 + 2 - -1; }'))
+        self.assertIn('ret i32 43', ir)
+        self.assertNotIn('mul', ir)
+
+    def test_propagation(self):
+        ''' Never assigned locals are replaced by their value '''
+        data = '''
+        medio main() {
+            medio a = 10;
+            medio b = 4;
+            devolve a - b;
+        }
+        '''
+        ir = generate(parse(data))
+        self.assertIn('ret i32 6', ir)
+        self.assertNotIn('load', ir)
+
+    def test_assigned(self):
+        ''' Assigned variables are not constants '''
+        data = '''
+        medio main() {
+            medio a = 10;
+            a = 3;
+            devolve a * 2;
+        }
+        '''
+        ir = generate(parse(data))
+        self.assertIn('load', ir)
+        self.assertEqual(run(parse(data)), 6)
+
+    def test_global(self):
+        ''' Globals may be initialized with constant expressions '''
+        data = 'medio g = 6 * 7; medio main() { devolve g; }'
+        self.assertEqual(run(parse(data)), 42)
+
+    def test_semantics(self):
+        ''' Folded and generated code compute the same values '''
+        expressions = (
+            ('medio', '7 / 2'),
+            ('medio', '0 - 7 / 2'),
+            ('medio', '(0 - 7) / 2'),
+            ('medio', '(0 - 7) % 3'),
+            ('medio', '7 % (0 - 3)'),
+            ('medio', '2147483647 + 1'),
+            ('medio', '65536 * 65536'),
+            ('medio', '2.9 + 1'),
+            ('comprido', '2147483647 + 1'),
+            ('flutua', '1.1 * 3'),
+            ('flutua', '7.5 % 2'),
+            ('flutua', '1 / 3.0'),
+            ('opiniao', '0 - 1 >= 1'),
+        )
+        for typ, expr in expressions:
+            data = '%s main() { %s a = %s; devolve a; }' % (typ, typ, expr)
+            folded = run(parse(data))
+            unfolded = run(parse(data), Options(fold=False))
+            self.assertEqual(folded, unfolded, expr)
+
+    def test_float_comparison(self):
+        data = 'opiniao main() { devolve 1.5 < 2 + 0.25; }'
+        self.assertIs(run(parse(data)), True)
+
+    def test_division_by_zero(self):
+        ''' Left to run time '''
+        self.assertIsNone(fold_operation(OpTypes.DIV, Types.INT, 1, 0))
+        self.assertIsNone(fold_operation(OpTypes.MOD, Types.INT, 1, 0))
+        ir = generate(parse('medio main() { devolve 1 / 0; }'))
+        self.assertIn('sdiv', ir)
+
+    def test_cast(self):
+        literal = Literal(2.9, Types.FLOAT).cast(Types.SHORT)
+        self.assertEqual((literal.value, literal.type), (2, Types.SHORT))
+        self.assertEqual(Literal(70000, Types.INT).cast(Types.SHORT).value,
+                         4464)
+        self.assertIsNone(Literal(b'a', Types.CHAR).cast(Types.CHAR))
+
+
+class TestEvaluate(TestCase):
+    options = Options(ctfe=STEPS)
+
+    def test_call(self):
+        ''' Calls with literal args are replaced by their value '''
+        with open(os.path.join(ROOT, 'example.ce')) as f:
+            data = f.read()
+        ir = generate(parse(data), self.options)
+        main = ir[ir.index('@"main"'):]
+        self.assertNotIn('call', main)
+        self.assertIn('120', main)
+        self.assertEqual(run(parse(data), self.options), 120)
+
+    def test_recursion(self):
+        data = '''
+        comprido fib(medio n) {
+            se (n < 2) {
+                devolve n;
+            }
+            devolve fib(n - 1) + fib(n - 2);
+        }
+        comprido main() { devolve fib(80); }
+        '''
+        ir = generate(parse(data), self.options)
+        self.assertIn('ret i64 23416728348467685', ir)
+
+    def test_loops(self):
+        data = '''
+        medio f(medio n) {
+            medio total = 0;
+            medio i = 0;
+            enquanto (i < n) {
+                caso (i % 3) {
+                    seja (1) { total = total + i; }
+                    seja (2) { total = total - 1; }
+                }
+                i = i + 1;
+            }
+            devolve total;
+        }
+        medio main() { devolve f(10); }
+        '''
+        self.assertEqual(run(parse(data), self.options), run(parse(data)))
+        self.assertNotIn('call', generate(parse(data), self.options)
+                         .split('@"main"')[1])
+
+    def test_impure(self):
+        ''' Functions using globals are called at run time '''
+        data = '''
+        medio g = 1;
+        medio f(medio a) { g = g + a; devolve g; }
+        medio main() { devolve f(2); }
+        '''
+        ir = generate(parse(data), self.options)
+        self.assertIn('call i32 @"f"(i32 2)', ir)
+
+    def test_budget(self):
+        ''' Calls over the budget are called at run time '''
+        data = '''
+        medio f(medio n) {
+            medio i = 0;
+            enquanto (i < n) { i = i + 1; }
+            devolve i;
+        }
+        medio main() { devolve f(1000); }
+        '''
+        ir = generate(parse(data), Options(ctfe=100))
+        self.assertIn('call i32 @"f"(i32 1000)', ir)
+        ir = generate(parse(data), Options(ctfe=10000))
+        self.assertNotIn('call', ir)
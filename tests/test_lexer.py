@@ -1,6 +1,7 @@
+import tempfile
 from unittest import TestCase
 
-from ce.lexer import lexer
+from ce.lexer import lexer, tokenize, tokenize_file, TokenArray
 
 class TestLexer(TestCase):
     def setUp(self):
@@ -219,3 +220,79 @@ class TestLexer(TestCase):
         for res, exp in zip(self.lexer, expected):
             self.assertEqual(res.type, exp[0])
             self.assertEqual(res.value, exp[1])
+
+
+class TestTokenize(TestCase):
+    ''' Streaming lexer, with tiny chunks to cross every boundary '''
+    data = (
+        'medio a = 10; // some comment\n'
+        '/* multi\n line\n comment */\n'
+        'letras s = "some\ntext";\n'
+        'letra c = \'c\';\n'
+        'duplo d = 12.5;\n'
+    )
+
+    def assertTokens(self, result, expected):
+        self.assertEqual(
+            [(t.type, t.value, t.lineno, t.lexpos) for t in result],
+            [(t.type, t.value, t.lineno, t.lexpos) for t in expected]
+        )
+
+    def test_same_tokens(self):
+        ''' Same tokens as lexing the whole text '''
+        lex = lexer.clone()
+        lex.lineno = 1
+        lex.input(self.data)
+        expected = list(lex)
+        for size in (1, 2, 3, 7, 64):
+            self.assertTokens(tokenize(self.data, size), expected)
+
+    def test_bytes(self):
+        ''' Multi-byte characters split between chunks '''
+        data = '"ação"\na'
+        tokens = list(tokenize(data.encode(), 1))
+        self.assertEqual(tokens[0].value, 'ação'.encode())
+        self.assertEqual(tokens[1].lineno, 2)
+
+    def test_file(self):
+        ''' Memory mapped file '''
+        with tempfile.NamedTemporaryFile('w', suffix='.ce') as f:
+            f.write(self.data)
+            f.flush()
+            result = list(tokenize_file(f.name, 5))
+        expected = list(tokenize(self.data))
+        self.assertTokens(result, expected)
+
+    def test_lines(self):
+        ''' Lines are counted inside comments and strings '''
+        tokens = list(tokenize(self.data, 4))
+        self.assertEqual(tokens[-1].lineno, 8)
+
+    def test_unclosed_comment(self):
+        ''' Unclosed comment at the end of the source '''
+        tokens = [t.type for t in tokenize('a\n/* b\n', 2)]
+        self.assertEqual(tokens, ['ID', '/', '*', 'ID'])
+
+
+class TestTokenArray(TestCase):
+    data = TestTokenize.data
+
+    def test_same_tokens(self):
+        ''' Same tokens as lexer.token() '''
+        expected = list(tokenize(self.data))
+        result = list(TokenArray(self.data))
+        self.assertEqual(
+            [(t.type, t.value, t.lineno, t.lexpos) for t in result],
+            [(t.type, t.value, t.lineno, t.lexpos) for t in expected]
+        )
+
+    def test_interned(self):
+        ''' Each value is stored once '''
+        tokens = TokenArray('a = 1; a = 1.0; a = 1;')
+        self.assertEqual(len(tokens), 12)
+        self.assertEqual(tokens.table, ['a', '=', 1, ';', 1.0])
+
+    def test_error(self):
+        ''' Lexer error '''
+        with self.assertRaises(SyntaxError):
+            TokenArray('a\n' + chr(0))
@@ -0,0 +1,34 @@
+from unittest import TestCase
+
+from ce.parser import create_parser
+from ce.semantic.node import walk, memory_report
+
+
+class TestNode(TestCase):
+    data = 'medio f(medio a) { devolve a + 1; } medio b = 2;'
+
+    def setUp(self):
+        parser = create_parser(debug=False, cache=True)
+        self.tree = parser.parse(self.data)
+
+    def test_slots(self):
+        ''' Nodes have no instance dict '''
+        for node in walk(self.tree):
+            self.assertFalse(hasattr(node, '__dict__'), node)
+
+    def test_walk(self):
+        ''' Every node, parents first '''
+        names = [type(n).__name__ for n in walk(self.tree)]
+        expected = [
+            'Main', 'DeclFunction', 'DeclVariable', 'Block', 'Return',
+            'OpBin', 'Var', 'Literal', 'DeclVariable', 'Literal'
+        ]
+        self.assertEqual(names, expected)
+
+    def test_memory_report(self):
+        report = memory_report(self.tree)
+        self.assertEqual(report['nodes'], 10)
+        self.assertEqual(report['classes']['DeclVariable'][0], 2)
+        total = sum(size for _, size in report['classes'].values())
+        self.assertEqual(report['bytes'], total)
+        self.assertGreater(report['bytes'], 0)
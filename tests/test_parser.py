@@ -0,0 +1,172 @@
+import os
+import time
+from enum import Enum
+from unittest import TestCase
+
+from ce.lexer import TokenArray, lexer
+from ce.parser import create_parser
+from ce.semantic.node import Node
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CORPUS = [
+    '',
+    'medio a;',
+    'medio a = 1; duplo b = 2.5; letra c = \'c\'; letras d = "d";',
+    'opiniao a = concordo; opiniao b = discordo;',
+    'medio a[10]; medio b[2][3]; a = 2; a[1] = 3; b[1][2] = a[1] + 1;',
+    'a = 1 + 2 * 3 - 4 / 5 % 6;',
+    'a = (1 + 2) * -3 - -(4 - 5);',
+    'a = 1 < 2; a = 1 >= 2 + 3; a = 1 == 2 != 3; a = 1 <= 2 > 3;',
+    'a - b - c; a[1] * 2; -a * b; f(); f(1); f(1, g(2, 3), 4 + 5);',
+    'nada f() {} curto g(curto a, comprido b[3]) { devolve; }',
+    'nada f(); medio g(medio a, flutua b); medio g(medio a, flutua b) {}',
+    '''
+    medio f(medio a) {
+        // comment
+        se (a > 1) { devolve a; }
+        se (a < 1) { a = 1; } senao { a = 2; }
+        para (medio i = 0; i < 10; i = i + 1) { a = a * i; }
+        enquanto (a > 0) { a = a - 1; }
+        caso (a) {
+            seja (1) { a = 2; }
+            seja (2) { }
+        }
+        caso (a) { seja (1) { a = 2; } senao { a = 3; } }
+        @vetoriza(8) @desenrola
+        para (medio j = 0; j < 8; j = j + 1) { a = a + j; }
+        @independente enquanto (a > 0) { a = a - 1; }
+        /* multi
+           line */
+        f(a);
+        devolve a + 1;
+    }
+    ''',
+]
+
+
+def dump(node):
+    ''' Comparable representation of a parse tree '''
+    if isinstance(node, Node):
+        attrs = node.fields()
+        return (type(node).__name__, tuple(
+            (k, dump(v)) for k, v in sorted(attrs) if k != 'module'))
+    if isinstance(node, (list, tuple)):
+        return [dump(n) for n in node]
+    if isinstance(node, Enum):
+        return node.name
+    return node
+
+
+def statements(count):
+    ''' Source with a function of `count` statements '''
+    body = '    a = a + 1;\n' * count
+    return 'medio main() {\n    medio a = 0;\n%s    devolve a;\n}\n' % body
+
+
+def commands(count):
+    ''' Source with `count` top level commands '''
+    return ''.join('medio a%d = %d;\n' % (i, i) for i in range(count))
+
+
+class TestScaling(TestCase):
+    ''' Parsing time grows linearly with the size of the source '''
+    sizes = (1000, 10000, 100000)
+
+    def setUp(self):
+        self.parser = create_parser(debug=False, cache=True)
+
+    def per_item(self, source, count):
+        ''' Best time to parse `source`, divided by `count` '''
+        data = source(count)
+        best = float('inf')
+        for _ in range(3 if count < 100000 else 1):
+            start = time.perf_counter()
+            self.parser.parse(data)
+            best = min(best, time.perf_counter() - start)
+        return best / count
+
+    def assertLinear(self, source):
+        times = [self.per_item(source, count) for count in self.sizes]
+        # Quadratic growth would make the last ratio close to 100
+        self.assertLess(times[-1] / times[0], 4, times)
+
+    def test_statements(self):
+        ''' Statements inside a function '''
+        result = self.parser.parse(statements(10))
+        self.assertEqual(len(result.commands[0].block.commands), 12)
+        self.assertLinear(statements)
+
+    def test_commands(self):
+        ''' Top level commands '''
+        result = self.parser.parse(commands(10))
+        self.assertEqual(len(result.commands), 10)
+        self.assertLinear(commands)
+
+
+def tokens(data):
+    ''' (type, value, lineno, lexpos) of the tokens of `lexer.token()` '''
+    scanner = lexer.clone()
+    scanner.lineno = 1
+    scanner.input(data)
+    return [(t.type, t.value, t.lineno, t.lexpos)
+            for t in iter(scanner.token, None)]
+
+
+class TestTokenArray(TestCase):
+    '''
+    TokenArray.scan lexes with the internals of PLY, rather than
+    `lexer.token()`, so the trees parsed from its tokens are checked against
+    those parsed from the lexer
+    '''
+
+    def setUp(self):
+        self.parser = create_parser(debug=False, cache=True)
+
+    def assertSameTree(self, data):
+        array = TokenArray(data)
+        self.assertEqual([(t.type, t.value, t.lineno, t.lexpos)
+                          for t in array], tokens(data), data)
+        expected = dump(self.parser.parse(data))
+        result = dump(self.parser.parse(lexer=array.stream()))
+        self.assertEqual(result, expected, data)
+
+    def test_corpus(self):
+        for data in CORPUS:
+            self.assertSameTree(data)
+
+    def test_example(self):
+        with open(os.path.join(ROOT, 'example.ce')) as f:
+            self.assertSameTree(f.read())
+
+
+class TestBackends(TestCase):
+    ''' The PLY and the hand written parsers build the same tree '''
+
+    def setUp(self):
+        self.ply = create_parser(debug=False, cache=True)
+        self.descent = create_parser(backend='descent')
+
+    def assertSameTree(self, data):
+        expected = dump(self.ply.parse(data))
+        result = dump(self.descent.parse(data))
+        self.assertEqual(result, expected, data)
+
+    def test_corpus(self):
+        for data in CORPUS:
+            self.assertSameTree(data)
+
+    def test_example(self):
+        with open(os.path.join(ROOT, 'example.ce')) as f:
+            self.assertSameTree(f.read())
+
+    def test_error(self):
+        ''' Syntax errors raise '''
+        for data in ('medio;', 'a = ;', 'se (a) {', 'medio f( {}', '1 +'):
+            with self.assertRaises(SyntaxError, msg=data):
+                self.descent.parse(data)
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            create_parser(backend='unknown')
@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import tempfile
+import tracemalloc
+import subprocess
+from unittest import TestCase
+
+from ce.compiler import Options, compile_file, compile_timed
+from ce.phases import Phases
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+
+
+class TestPhases(TestCase):
+    data = '''
+medio g = 2;
+medio dobro(medio x);
+medio main() { devolve dobro(g) + 17; }
+medio dobro(medio x) { se (x > 0) { devolve x * 2; } devolve 0; }
+'''
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.filename = os.path.join(self.dir.name, 'a.ce')
+        with open(self.filename, 'w') as f:
+            f.write(self.data)
+
+    def test_output(self):
+        ''' The output is the one of compile_file '''
+        for options in (Options(), Options(opt='2')):
+            for kind in ('ir', 'obj'):
+                expected = compile_file(self.filename, options, kind=kind)
+                output = compile_timed(self.filename, Phases(), options,
+                                       kind)
+                self.assertEqual(output, expected, (options, kind))
+
+    def test_measures(self):
+        phases = Phases()
+        compile_timed(self.filename, phases, Options(opt='2'))
+        names = [phase[0] for phase in phases.phases]
+        self.assertEqual(names, ['lex', 'parse', 'validate', 'fold',
+                                 'generate', 'serialize', 'verify',
+                                 'optimize', 'emit'])
+        for _, wall, cpu, peak in phases.phases:
+            self.assertGreaterEqual(wall, 0)
+            self.assertGreaterEqual(cpu, 0)
+            # Not traced
+            self.assertIsNone(peak)
+        # Prototypes are not measured
+        self.assertEqual(list(phases.functions), ['main', 'dobro'])
+        self.assertEqual(set(phases.functions['dobro']),
+                         {'validate', 'fold', 'generate'})
+        self.assertGreater(phases.nodes, 10)
+        self.assertEqual(set(phases.instructions), {'main', 'dobro'})
+
+    def test_add_peaks(self):
+        ''' Peaks of a traced compile are merged, keeping the times '''
+        phases, traced = Phases(), Phases()
+        compile_timed(self.filename, phases)
+        tracemalloc.start()
+        try:
+            compile_timed(self.filename, traced)
+        finally:
+            tracemalloc.stop()
+        times = [phase[1:3] for phase in phases.phases]
+        phases.add_peaks(traced)
+        self.assertEqual([phase[1:3] for phase in phases.phases], times)
+        self.assertEqual([phase[3] for phase in phases.phases],
+                         [phase[3] for phase in traced.phases])
+        self.assertGreater(phases.phases[0][3], 0)
+        self.assertEqual(phases.functions['dobro']['generate'][2],
+                         traced.functions['dobro']['generate'][2])
+
+    def test_nested_peak(self):
+        ''' A phase sees the peak of the functions measured inside it '''
+        phases = Phases()
+        tracemalloc.start()
+        try:
+            with phases.phase('outer'):
+                with phases.function('f', 'generate'):
+                    data = bytearray(1 << 20)
+                    del data
+                small = bytearray(1024)
+            del small
+        finally:
+            tracemalloc.stop()
+        inner = phases.functions['f']['generate'][2]
+        self.assertGreater(inner, 1 << 19)
+        self.assertGreaterEqual(phases.phases[0][3], inner)
+        self.assertFalse(phases._peaks)
+
+    def test_main(self):
+        ''' --time-phases prints JSON to stderr and still writes the IR '''
+        process = subprocess.run(
+            [sys.executable, MAIN, '-f', self.filename, '--time-phases',
+             'json', '--phase-memory'], capture_output=True, check=True)
+        self.assertIn(b'define i32 @"main"', process.stdout)
+        report = json.loads(process.stderr)
+        self.assertEqual(report['phases'][0]['name'], 'lex')
+        self.assertIn('dobro', report['functions'])
+        self.assertGreater(report['phases'][0]['peak'], 0)
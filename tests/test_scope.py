@@ -0,0 +1,58 @@
+from unittest import TestCase
+
+from ce.scope import Scopes
+
+
+class TestScopes(TestCase):
+    def setUp(self):
+        self.scopes = Scopes()
+
+    def test_get(self):
+        ''' Innermost binding wins '''
+        self.scopes['a'] = 1
+        self.scopes.create()
+        self.assertEqual(self.scopes.get('a'), 1)
+        self.scopes['a'] = 2
+        self.assertEqual(self.scopes.get('a'), 2)
+        self.assertIsNone(self.scopes.get('b'))
+
+    def test_pop(self):
+        ''' Popping restores the outer bindings '''
+        self.scopes['a'] = 1
+        self.scopes.create()
+        self.scopes['a'] = 2
+        self.scopes['b'] = 3
+        self.assertEqual(self.scopes.pop(), {'a': 2, 'b': 3})
+        self.assertEqual(self.scopes.get('a'), 1)
+        self.assertIsNone(self.scopes.get('b'))
+
+    def test_set_twice(self):
+        ''' Setting a name twice in a scope replaces it '''
+        self.scopes.create()
+        self.scopes['a'] = 1
+        self.scopes['a'] = 2
+        self.scopes.pop()
+        self.assertIsNone(self.scopes.get('a'))
+
+    def test_current(self):
+        self.scopes['a'] = 1
+        with self.scopes() as scope:
+            self.assertIs(scope, self.scopes)
+            self.assertNotIn('a', scope)
+            self.assertEqual(scope.current, {})
+            scope['b'] = 2
+            self.assertIn('b', scope)
+            self.assertEqual(scope['b'], 2)
+        self.assertIn('a', self.scopes)
+        self.assertEqual(self.scopes['a'], 1)
+        self.assertNotIn('b', self.scopes)
+
+    def test_deep(self):
+        for depth in range(256):
+            self.scopes.create()
+            self.scopes['v%d' % depth] = depth
+        self.assertEqual(self.scopes.get('v0'), 0)
+        for _ in range(256):
+            self.scopes.pop()
+        self.assertIsNone(self.scopes.get('v0'))
+        self.assertEqual(self.scopes.scopes, [{}])
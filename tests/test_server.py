@@ -0,0 +1,215 @@
+import io
+import os
+import sys
+import shutil
+import socket
+import tempfile
+import threading
+import contextlib
+import subprocess
+import importlib.util
+from unittest import TestCase, mock
+
+from ce import client
+from ce.client import check_peer, exit_status, private_dir, request, \
+    socket_path
+from ce.ctfe import STEPS
+from ce.compiler import Options, emit
+from ce.parser import create_parser
+from ce.server import CompileServer
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+
+
+class TestServer(TestCase):
+    data = 'medio main() { medio a = 6; devolve a * 7; }'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.path = tempfile.mkdtemp()
+        cls.socket = os.path.join(cls.path, 'ce.sock')
+        cls.server = CompileServer(cls.socket, cache=False, timeout=2)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.thread.join()
+        shutil.rmtree(cls.path)
+
+    def request(self, message):
+        output = io.BytesIO()
+        header = request(message, output, self.socket)
+        return header, output.getvalue()
+
+    def test_compile(self):
+        ''' The output is streamed back, as compiled in-process '''
+        filename = os.path.join(self.path, 'a.ce')
+        with open(filename, 'w') as f:
+            f.write(self.data)
+        tree = create_parser(debug=False, cache=True).parse(self.data)
+        expected = emit(tree, Options(opt='2'), 'obj')
+        header, output = self.request({
+            'command': 'compile', 'file': filename, 'kind': 'obj',
+            'options': {'opt': '2'},
+        })
+        self.assertEqual(header, {'status': 'ok', 'size': len(expected)})
+        self.assertEqual(output, expected)
+
+    def test_check(self):
+        header, _ = self.request({'command': 'check', 'source': self.data})
+        self.assertEqual(header['status'], 'ok')
+        header, _ = self.request({'command': 'check',
+                                  'source': 'medio main() { devolve x; }'})
+        self.assertEqual(header['status'], 'error')
+        self.assertIn('"x" not declared', header['error'])
+
+    def test_run(self):
+        header, _ = self.request({'command': 'run', 'source': self.data})
+        self.assertEqual(header['value'], 42)
+
+    def test_trap(self):
+        ''' Programs that trap or never return do not kill the server '''
+        trap = 'medio f(medio i) { medio v[4]; v[i] = 1; devolve v[i]; } ' \
+               'medio main() { devolve f(9); }'
+        header, _ = self.request({'command': 'run', 'source': trap,
+                                  'options': {'checks': True}})
+        self.assertEqual(header['status'], 'error')
+        self.assertIn('killed by SIGILL', header['error'])
+
+        loop = 'medio main() { enquanto (concordo) {} devolve 0; }'
+        header, _ = self.request({'command': 'run', 'source': loop})
+        self.assertEqual(header['status'], 'error')
+        self.assertIn('TimeoutError', header['error'])
+
+        header, _ = self.request({'command': 'run', 'source': self.data})
+        self.assertEqual(header['value'], 42)
+
+    def test_syntax_error(self):
+        ''' Malformed buffers are errors, not empty outputs '''
+        source = 'medio main() {\n    devolve 1\n}'
+        for command in ('check', 'compile', 'run'):
+            header, output = self.request({'command': command,
+                                           'source': source})
+            self.assertEqual(header['status'], 'error', command)
+            self.assertIn('SyntaxError: Error at line 3', header['error'])
+            self.assertEqual(output, b'')
+        header, _ = self.request({'command': 'check',
+                                  'source': 'medio main() {'})
+        self.assertIn('Unexpected end of file', header['error'])
+
+    def test_errors(self):
+        for message in ({'command': 'format'}, {'command': 'check'},
+                        {'command': 'run', 'source': self.data,
+                         'options': {'level': 2}}):
+            header, output = self.request(message)
+            self.assertEqual(header['status'], 'error', message)
+            self.assertEqual(output, b'')
+
+    def test_concurrent(self):
+        ''' Clients are served at the same time '''
+        results = [None] * 16
+
+        def client(i):
+            source = 'medio main() { devolve %d; }' % i
+            results[i] = self.request({'command': 'compile', 'kind': 'ir',
+                                       'source': source})
+
+        threads = [threading.Thread(target=client, args=(i,))
+                   for i in range(len(results))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for i, (header, output) in enumerate(results):
+            self.assertEqual(header['status'], 'ok')
+            self.assertIn(b'ret i32 %d' % i, output)
+
+
+class TestSocketPath(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def test_runtime_dir(self):
+        env = {'XDG_RUNTIME_DIR': self.dir.name, 'CE_SOCKET': ''}
+        with mock.patch.dict(os.environ, env):
+            self.assertEqual(socket_path(),
+                             os.path.join(self.dir.name, 'ce.sock'))
+
+    def test_private_dir(self):
+        path = os.path.join(self.dir.name, 'ce')
+        self.assertEqual(private_dir(path), path)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o700)
+        # Others could bind the socket
+        os.chmod(path, 0o777)
+        with self.assertRaises(PermissionError):
+            private_dir(path)
+        link = os.path.join(self.dir.name, 'link')
+        os.symlink(self.dir.name, link)
+        with self.assertRaises(PermissionError):
+            private_dir(link)
+
+    def test_peer(self):
+        ''' Servers of other users are not trusted '''
+        client, server = socket.socketpair(socket.AF_UNIX)
+        with client, server:
+            check_peer(client)
+            with mock.patch('os.getuid', return_value=os.getuid() + 1):
+                with self.assertRaises(PermissionError):
+                    check_peer(client)
+
+
+class TestExitStatus(TestCase):
+    def test_values(self):
+        ''' Values that are not a status are printed '''
+        for value, status, printed in ((42, 42, ''), (300, 44, '300\n'),
+                                       (-1, 255, '-1\n'),
+                                       (1.5, 0, '1.5\n'),
+                                       (True, 0, 'concordo\n'),
+                                       (False, 0, 'discordo\n')):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(exit_status(value), status, value)
+            self.assertEqual(output.getvalue(), printed, value)
+
+
+class TestClient(TestCase):
+    ''' The client copies these from main.py, as it only imports the
+    standard library '''
+
+    @classmethod
+    def setUpClass(cls):
+        spec = importlib.util.spec_from_file_location('main', MAIN)
+        cls.main = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(cls.main)
+
+    def test_ctfe(self):
+        args = client.create_argparse().parse_args(['-f', 'a.ce', '--ctfe'])
+        self.assertEqual(args.ctfe, STEPS)
+
+    def test_output_kind(self):
+        self.assertEqual(client.EXTENSIONS, self.main.EXTENSIONS)
+        for argv in (['-o', 'a.ll'], ['-o', 'a.bc'], ['-o', 'a.s'],
+                     ['-o', 'a.o'], ['-o', 'a'], [], ['--emit', 'asm']):
+            argv = ['-f', 'a.ce'] + argv
+            self.assertEqual(
+                client.output_kind(client.create_argparse().parse_args(argv)),
+                self.main.output_kind(
+                    self.main.create_argparse().parse_args(argv)), argv)
+
+    def test_lazy_server(self):
+        ''' Compiles do not import the server '''
+        with tempfile.TemporaryDirectory() as path:
+            filename = os.path.join(path, 'a.ce')
+            with open(filename, 'w') as f:
+                f.write(TestServer.data)
+            process = subprocess.run(
+                [sys.executable, '-X', 'importtime', MAIN, '-f', filename,
+                 '--no-cache'], capture_output=True, check=True)
+        self.assertIn(b'ce.compiler', process.stderr)
+        self.assertNotIn(b'ce.server', process.stderr)